@@ -9,14 +9,13 @@ import os
 import json
 import hashlib
 import base64
-import subprocess
 import tempfile
 from datetime import datetime
-from cryptography.fernet import Fernet
 from cryptography.hazmat.primitives import hashes, serialization
 from cryptography.hazmat.primitives.kdf.pbkdf2 import PBKDF2HMAC
 from cryptography.hazmat.primitives.asymmetric import rsa
 import numpy as np
+from usb_origin_capture_system import matching_usb_fingerprint, probe_usb_info, usb_binding_ciphers
 
 class DualNFCGitHubAuth:
     """Dual NFC scan system for GitHub authentication"""
@@ -65,22 +64,8 @@ class DualNFCGitHubAuth:
         
         try:
             # Get current USB characteristics
-            result = subprocess.run(['diskutil', 'info', usb_path], 
-                                  capture_output=True, text=True)
-            
-            current_info = {}
-            for line in result.stdout.split('\n'):
-                if 'Volume UUID' in line:
-                    current_info['volume_uuid'] = line.split(':')[1].strip()
-                elif 'Device / Media Name' in line:
-                    current_info['device_name'] = line.split(':')[1].strip()
-                elif 'Total Size' in line:
-                    current_info['total_size'] = line.split(':')[1].strip()
-                elif 'File System Personality' in line:
-                    current_info['filesystem'] = line.split(':')[1].strip()
-            
-            # Add mount point to match capture system (use stable characteristics only)
-            current_info['mount_point'] = usb_path
+            # Same diskutil parse the capture system used when the pack was created
+            current_info = probe_usb_info(usb_path)
             
             # Load expected metadata from pack
             pack_files = os.listdir(self.usb_pack_path)
@@ -100,8 +85,7 @@ class DualNFCGitHubAuth:
             expected_mount = pack_container['validation']['requires_original_mount']
             
             # Create current fingerprint matching capture system format
-            fingerprint_data = str(sorted(current_info.items()))
-            current_fingerprint = hashlib.sha256(fingerprint_data.encode()).hexdigest()
+            current_fingerprint = matching_usb_fingerprint(current_info, expected_fingerprint)
             
             print(f"   Current mount: {current_info.get('mount_point', 'Unknown')}")
             print(f"   Expected mount: {expected_mount}")
@@ -155,24 +139,18 @@ class DualNFCGitHubAuth:
             with open(json_file, 'r') as f:
                 pack_container = json.load(f)
             
-            # Create USB-specific decryption key
+            # Create USB-specific decryption keys
             usb_fingerprint = pack_container['validation']['requires_usb_fingerprint']
-            usb_key_material = (usb_fingerprint + "USB_BINDING").encode()
-            usb_kdf = PBKDF2HMAC(
-                algorithm=hashes.SHA256(),
-                length=32,
-                salt=b'USB_SPECIFIC_BINDING',
-                iterations=50000,
-            )
-            usb_key = base64.urlsafe_b64encode(usb_kdf.derive(usb_key_material))
-            usb_cipher = Fernet(usb_key)
+            binding_kdf = pack_container['pack_metadata'].get('binding_kdf')
+            kdf_iterations = pack_container['pack_metadata'].get('usb_kdf_iterations')
+            nfc_cipher, chaos_cipher = usb_binding_ciphers(usb_fingerprint, binding_kdf, kdf_iterations)
             
             # Decrypt values
             encrypted_nfc = pack_container['pack_metadata']['nfc_hash_encrypted']
             encrypted_chaos = pack_container['pack_metadata']['chaos_encrypted']
             
-            decrypted_nfc = usb_cipher.decrypt(encrypted_nfc.encode()).decode()
-            decrypted_chaos = usb_cipher.decrypt(encrypted_chaos.encode()).decode()
+            decrypted_nfc = nfc_cipher.decrypt(encrypted_nfc.encode()).decode()
+            decrypted_chaos = chaos_cipher.decrypt(encrypted_chaos.encode()).decode()
             
             # Verify first NFC scan matches
             if decrypted_nfc != nfc_hash:
@@ -7,15 +7,14 @@ NFC scan acts as SSH passkey, triggers USB unlock + key generation
 import os
 import json
 import hashlib
-import base64
 import subprocess
 import tempfile
 from datetime import datetime
-from cryptography.fernet import Fernet
 from cryptography.hazmat.primitives import hashes, serialization
 from cryptography.hazmat.primitives.kdf.pbkdf2 import PBKDF2HMAC
 from cryptography.hazmat.primitives.asymmetric import rsa
 import numpy as np
+from usb_origin_capture_system import usb_binding_ciphers
 
 class NFCPasskeySSHSystem:
     """SSH system where NFC scan = passkey that unlocks everything"""
@@ -141,22 +140,16 @@ fi
         
         # Decrypt with NFC passkey as the key
         try:
-            usb_key_material = (usb_fingerprint + "USB_BINDING").encode()
-            usb_kdf = PBKDF2HMAC(
-                algorithm=hashes.SHA256(),
-                length=32,
-                salt=b'USB_SPECIFIC_BINDING',
-                iterations=50000,
-            )
-            usb_key = base64.urlsafe_b64encode(usb_kdf.derive(usb_key_material))
-            usb_cipher = Fernet(usb_key)
+            binding_kdf = pack_container['pack_metadata'].get('binding_kdf')
+            kdf_iterations = pack_container['pack_metadata'].get('usb_kdf_iterations')
+            nfc_cipher, chaos_cipher = usb_binding_ciphers(usb_fingerprint, binding_kdf, kdf_iterations)
             
             # Decrypt values
             encrypted_nfc = pack_container['pack_metadata']['nfc_hash_encrypted']
             encrypted_chaos = pack_container['pack_metadata']['chaos_encrypted']
             
-            decrypted_nfc = usb_cipher.decrypt(encrypted_nfc.encode()).decode()
-            decrypted_chaos = usb_cipher.decrypt(encrypted_chaos.encode()).decode()
+            decrypted_nfc = nfc_cipher.decrypt(encrypted_nfc.encode()).decode()
+            decrypted_chaos = chaos_cipher.decrypt(encrypted_chaos.encode()).decode()
             
             # Verify NFC passkey matches stored value
             if decrypted_nfc != nfc_passkey:
@@ -20,6 +20,7 @@ from cryptography.hazmat.primitives.kdf.pbkdf2 import PBKDF2HMAC
 from cryptography.hazmat.primitives.asymmetric import rsa
 from cryptography.hazmat.primitives import serialization
 import base64
+from zero_knowledge_nfc_auth import _bind_ambient_hash, _fast_file_hash
 
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 
@@ -228,11 +229,12 @@ def zero_knowledge_auth():
     audio_info = pack_data['encrypted_ambient_data']
     audio_file = audio_info['file_path']
     
-    with open(audio_file, 'rb') as f:
-        audio_data = f.read()
+    # Packs from zero_knowledge_nfc_auth.py record their ambient hash algorithm and digest
+    hash_alg = pack_data.get('pack_metadata', {}).get('ambient_hash_alg', 'sha256')
+    audio_hash = audio_info.get('audio_hash') or _fast_file_hash(audio_file, hash_alg)
     
     # Verify unlock key
-    expected_hash = hashlib.sha256(f"{nfc_unlock_hash}{hashlib.sha256(audio_data).hexdigest()}".encode()).hexdigest()
+    expected_hash = _bind_ambient_hash(nfc_unlock_hash.encode(), audio_hash, hash_alg).hex()
     if expected_hash != audio_info['encrypted_hash']:
         print("❌ NFC unlock key verification failed")
         return False
@@ -247,7 +249,6 @@ def zero_knowledge_auth():
     
     # Assemble passphrase invisibly
     print("\n🔐 STEP 3: INVISIBLE PASSPHRASE ASSEMBLY")
-    audio_hash = hashlib.sha256(audio_data).hexdigest()
     composite_seed = f"{nfc_passphrase_hash}{audio_hash}"
     
     kdf = PBKDF2HMAC(
@@ -10,6 +10,12 @@ import time
 import os
 from datetime import datetime
 
+# Page-cache control is POSIX-only; Windows records without it
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
 class SongRecorder:
     """Simple 30-second ambient audio recorder"""
     
@@ -20,6 +26,7 @@ class SongRecorder:
         self.rate = 44100
         self.record_seconds = 30
         self.output_dir = "recorded_songs"
+        self.bypass_page_cache = False
         
         # Create output directory
         if not os.path.exists(self.output_dir):
@@ -76,11 +83,25 @@ class SongRecorder:
             print(f"\n✅ Recording complete!")
             
             # Save to WAV file
-            with wave.open(filepath, 'wb') as wf:
-                wf.setnchannels(self.channels)
-                wf.setsampwidth(audio.get_sample_size(self.format))
-                wf.setframerate(self.rate)
-                wf.writeframes(b''.join(frames))
+            with open(filepath, 'wb') as f:
+                if self.bypass_page_cache:
+                    self.disable_page_cache(f.fileno())
+                
+                with wave.open(f, 'wb') as wf:
+                    wf.setnchannels(self.channels)
+                    wf.setsampwidth(audio.get_sample_size(self.format))
+                    wf.setframerate(self.rate)
+                    wf.writeframes(b''.join(frames))
+                
+                if self.bypass_page_cache and not hasattr(fcntl, 'F_NOCACHE') and hasattr(os, 'posix_fadvise'):
+                    # No F_NOCACHE here: flush, then drop the written pages instead.
+                    # The recording is already written, so this is best-effort only
+                    try:
+                        f.flush()
+                        os.fdatasync(f.fileno())
+                        os.posix_fadvise(f.fileno(), 0, 0, os.POSIX_FADV_DONTNEED)
+                    except OSError:
+                        pass
             
             print(f"💾 Saved: {filepath}")
             print(f"📊 File size: {os.path.getsize(filepath)} bytes")
@@ -94,6 +115,15 @@ class SongRecorder:
         finally:
             audio.terminate()
     
+    def disable_page_cache(self, fd):
+        """Keep write-once recordings out of the page cache (macOS F_NOCACHE)"""
+        
+        if hasattr(fcntl, 'F_NOCACHE'):
+            try:
+                fcntl.fcntl(fd, fcntl.F_NOCACHE, 1)
+            except OSError:
+                pass
+    
     def list_recordings(self):
         """List all recorded song files"""
         
@@ -7,10 +7,19 @@ Creates cryptographic hashes and integrity checks to detect fraudulent USB edits
 import os
 import json
 import hashlib
+import hmac
 import time
 from datetime import datetime
 import subprocess
 
+def digests_match(stored_hex, current_hex):
+    """Constant-time comparison of hex digests as raw bytes"""
+    
+    try:
+        return hmac.compare_digest(bytes.fromhex(stored_hex), bytes.fromhex(current_hex))
+    except (TypeError, ValueError):
+        return False
+
 class USBFraudDetector:
     """Detect fraudulent modifications to USB authentication packs"""
     
@@ -55,36 +64,47 @@ class USBFraudDetector:
         
         return found_drives
     
-    def calculate_pack_integrity(self, pack_data):
+    def calculate_pack_integrity(self, pack_data, integrity_version='2.0'):
         """Calculate comprehensive integrity hash for pack"""
         
         # Create deterministic hash of all pack contents
         pack_string = json.dumps(pack_data, sort_keys=True, separators=(',', ':'))
+        pack_bytes = pack_string.encode()
         
-        # Multi-layer hashing for fraud detection
-        sha256_hash = hashlib.sha256(pack_string.encode()).hexdigest()
-        sha512_hash = hashlib.sha512(pack_string.encode()).hexdigest()
+        sha256_digest = hashlib.sha256(pack_bytes).digest()
+        sha256_hash = sha256_digest.hex()
         
-        # Create composite integrity signature
-        composite_data = (
-            sha256_hash + 
-            sha512_hash + 
-            str(len(pack_string)) +
-            str(pack_data.get('pack_metadata', {}).get('creation_time', 0))
-        ).encode()
-        
-        integrity_hash = hashlib.blake2b(composite_data, digest_size=32).hexdigest()
+        if integrity_version == '1.0':
+            # Legacy multi-layer hashing kept for verifying older packs
+            sha512_hash = hashlib.sha512(pack_bytes).hexdigest()
+            
+            composite_data = (
+                sha256_hash + 
+                sha512_hash + 
+                str(len(pack_string)) +
+                str(pack_data.get('pack_metadata', {}).get('creation_time', 0))
+            ).encode()
+            
+            integrity_hash = hashlib.blake2b(composite_data, digest_size=32).hexdigest()
+        else:
+            # BLAKE2b already covers the full pack, SHA-512 added no coverage
+            composite = hashlib.blake2b(pack_bytes, digest_size=32, person=b'composite-v2')
+            composite.update(sha256_digest)
+            composite.update(len(pack_string).to_bytes(8, 'little'))
+            integrity_hash = composite.hexdigest()
         
         integrity_record = {
-            'integrity_version': '1.0',
+            'integrity_version': integrity_version,
             'creation_time': time.time(),
             'pack_sha256': sha256_hash,
-            'pack_sha512': sha512_hash,
             'pack_size': len(pack_string),
             'composite_integrity': integrity_hash,
             'fraud_detection': 'enabled'
         }
         
+        if integrity_version == '1.0':
+            integrity_record['pack_sha512'] = sha512_hash
+        
         return integrity_record
     
     def create_integrity_protection(self, usb_path, pack_data):
@@ -104,7 +124,6 @@ class USBFraudDetector:
         
         print(f"✅ Integrity protection created")
         print(f"   SHA256: {integrity_record['pack_sha256'][:16]}...")
-        print(f"   SHA512: {integrity_record['pack_sha512'][:16]}...")
         print(f"   Composite: {integrity_record['composite_integrity'][:16]}...")
         print(f"   Protection file: {integrity_path}")
         
@@ -137,22 +156,26 @@ class USBFraudDetector:
             with open(integrity_path, 'r') as f:
                 stored_integrity = json.load(f)
             
-            # Recalculate current integrity
-            current_integrity = self.calculate_pack_integrity(pack_data)
+            # Recalculate current integrity with the stored scheme
+            integrity_version = stored_integrity.get('integrity_version', '1.0')
+            current_integrity = self.calculate_pack_integrity(pack_data, integrity_version)
             
             # Compare integrity hashes
             integrity_checks = {
-                'sha256_match': stored_integrity['pack_sha256'] == current_integrity['pack_sha256'],
-                'sha512_match': stored_integrity['pack_sha512'] == current_integrity['pack_sha512'],
+                'sha256_match': digests_match(stored_integrity['pack_sha256'], current_integrity['pack_sha256']),
                 'size_match': stored_integrity['pack_size'] == current_integrity['pack_size'],
-                'composite_match': stored_integrity['composite_integrity'] == current_integrity['composite_integrity']
+                'composite_match': digests_match(stored_integrity['composite_integrity'], current_integrity['composite_integrity'])
             }
             
+            if integrity_version == '1.0':
+                integrity_checks['sha512_match'] = digests_match(stored_integrity['pack_sha512'], current_integrity['pack_sha512'])
+            
             all_checks_passed = all(integrity_checks.values())
             
             print(f"📊 INTEGRITY VERIFICATION RESULTS:")
             print(f"   SHA256 Hash: {'✅ VALID' if integrity_checks['sha256_match'] else '❌ MODIFIED'}")
-            print(f"   SHA512 Hash: {'✅ VALID' if integrity_checks['sha512_match'] else '❌ MODIFIED'}")
+            if 'sha512_match' in integrity_checks:
+                print(f"   SHA512 Hash: {'✅ VALID' if integrity_checks['sha512_match'] else '❌ MODIFIED'}")
             print(f"   Pack Size: {'✅ VALID' if integrity_checks['size_match'] else '❌ MODIFIED'}")
             print(f"   Composite: {'✅ VALID' if integrity_checks['composite_match'] else '❌ MODIFIED'}")
             
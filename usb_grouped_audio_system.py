@@ -5,15 +5,57 @@ Multiple encryption packs with grouped ambient audio files
 """
 
 import hashlib
+import hmac
 import json
 import time
 import os
+import mmap
 import shutil
+import functools
+import subprocess
+import sys
 from datetime import datetime
 from cryptography.fernet import Fernet
 from cryptography.hazmat.primitives import hashes
+from cryptography.hazmat.primitives.kdf.hkdf import HKDF
 from cryptography.hazmat.primitives.kdf.pbkdf2 import PBKDF2HMAC
 import base64
+from usb_fraud_detection import digests_match
+
+try:
+    from song_recorder import SongRecorder
+except ImportError:
+    SongRecorder = None
+
+try:
+    from invisible_nfc_scanner import InvisibleNFCScanner
+except ImportError:
+    InvisibleNFCScanner = None
+
+@functools.lru_cache(maxsize=32)
+def derive_mapping_keys(audio_fingerprint):
+    """Derive NFC and chaos mapping keys from one PBKDF2 run per audio fingerprint"""
+    
+    kdf = PBKDF2HMAC(
+        algorithm=hashes.SHA256(),
+        length=32,
+        salt=b'AUDIO_MAPPING_ROOT',
+        iterations=50000,
+    )
+    root_key = kdf.derive(audio_fingerprint.encode())
+    
+    # Cheap HKDF expansion splits the root into independent subkeys
+    subkeys = []
+    for label in (b'NFC_MAPPING', b'CHAOS_MAPPING'):
+        hkdf = HKDF(
+            algorithm=hashes.SHA256(),
+            length=32,
+            salt=b'AUDIO_MAPPING_SUBKEY',
+            info=label,
+        )
+        subkeys.append(base64.urlsafe_b64encode(hkdf.derive(root_key)))
+    
+    return tuple(subkeys)
 
 class USBGroupedAudioSystem:
     """Manage grouped ambient audio encryption packs on USB"""
@@ -23,6 +65,7 @@ class USBGroupedAudioSystem:
         self.local_backup_dir = "local_audio_backup"
         self.encryption_packs_dir = "encryption_packs"
         self.group_manifest_file = "audio_group_manifest.json"
+        self._scanner = None
         
         # Create directories
         for directory in [self.local_backup_dir, self.encryption_packs_dir]:
@@ -37,7 +80,8 @@ class USBGroupedAudioSystem:
         
         # 1. Record new ambient audio for this pack
         print("🎤 Recording ambient audio for this encryption pack...")
-        from song_recorder import SongRecorder
+        if SongRecorder is None:
+            raise RuntimeError("song_recorder module not available - cannot record pack audio")
         recorder = SongRecorder()
         
         audio_filename = f"ambient_pack_{pack_id}_{int(time.time())}.wav"
@@ -60,11 +104,12 @@ class USBGroupedAudioSystem:
             # Hidden until unlock
             'nfc_hash_encrypted': self.encrypt_nfc_mapping(nfc_hash, audio_fingerprint),
             'chaos_value_encrypted': self.encrypt_chaos_mapping(chaos_value, audio_fingerprint),
+            'mapping_kdf': 'root-hkdf',
             'unlock_required': True
         }
         
         # 4. Create encrypted pack container
-        pack_container = self.create_pack_container(pack_metadata, audio_file, nfc_hash, chaos_value)
+        pack_container, encrypted_credentials = self.create_pack_container(pack_metadata, audio_file, nfc_hash, chaos_value)
         
         # 5. Save to local backup
         local_pack_dir = os.path.join(self.local_backup_dir, f"pack_{pack_id}")
@@ -75,9 +120,14 @@ class USBGroupedAudioSystem:
         with open(local_pack_file, 'w') as f:
             json.dump(pack_container, f, indent=2)
         
+        # Ciphertext lives next to the JSON as raw bytes (no base64 inflation)
+        local_credentials_file = os.path.join(local_pack_dir, pack_container['credentials_file'])
+        with open(local_credentials_file, 'wb') as f:
+            f.write(encrypted_credentials)
+        
         # 6. Copy audio to local backup
         local_audio_file = os.path.join(local_pack_dir, audio_filename)
-        shutil.copy2(audio_file, local_audio_file)
+        self.clone_file(audio_file, local_audio_file)
         
         print(f"✅ Encryption pack created: {pack_id}")
         print(f"   Local backup: {local_pack_file}")
@@ -115,15 +165,59 @@ class USBGroupedAudioSystem:
         usb_audio_file = os.path.join(usb_pack_dir, pack_container['pack_metadata']['audio_file'])
         
         if os.path.exists(local_audio_file):
-            shutil.copy2(local_audio_file, usb_audio_file)
+            self.stream_copy(local_audio_file, usb_audio_file)
             print(f"✅ Audio copied to USB: {pack_container['pack_metadata']['audio_file']}")
         
+        # Copy encrypted credentials blob
+        if 'credentials_file' in pack_container:
+            local_credentials_file = os.path.join(self.local_backup_dir, f"pack_{pack_id}", pack_container['credentials_file'])
+            usb_credentials_file = os.path.join(usb_pack_dir, pack_container['credentials_file'])
+            
+            if os.path.exists(local_credentials_file):
+                self.stream_copy(local_credentials_file, usb_credentials_file)
+                print(f"✅ Credentials copied to USB: {pack_container['credentials_file']}")
+        
         # Update USB group manifest
         self.update_usb_group_manifest(pack_id, pack_container['pack_metadata'])
         
         print(f"✅ Pack {pack_id} copied to USB successfully")
         return True
     
+    def clone_file(self, src, dst):
+        """Copy a local file using copy-on-write cloning where available"""
+        
+        if sys.platform == 'darwin':
+            clone_cmd = ['cp', '-p', '-c', src, dst]  # clonefile(2) on APFS
+        elif sys.platform.startswith('linux'):
+            clone_cmd = ['cp', '--preserve=mode,timestamps', '--reflink=auto', src, dst]
+        else:
+            clone_cmd = None
+        
+        if clone_cmd:
+            result = subprocess.run(clone_cmd, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+            if result.returncode == 0:
+                return dst
+        
+        return shutil.copy2(src, dst)
+    
+    def stream_copy(self, src, dst):
+        """Copy a file to USB with in-kernel sendfile, falling back to copy2"""
+        
+        try:
+            with open(src, 'rb') as fsrc, open(dst, 'wb') as fdst:
+                size = os.fstat(fsrc.fileno()).st_size
+                offset = 0
+                while offset < size:
+                    sent = os.sendfile(fdst.fileno(), fsrc.fileno(), offset, size - offset)
+                    if sent == 0:
+                        break
+                    offset += sent
+            shutil.copystat(src, dst)
+            return dst
+        except (AttributeError, OSError):
+            # sendfile() to regular files is unsupported on macOS
+            return shutil.copy2(src, dst)
+    
     def create_audio_fingerprint(self, audio_file):
         """Create unique fingerprint for audio file"""
         
@@ -160,30 +254,16 @@ class USBGroupedAudioSystem:
     def encrypt_nfc_mapping(self, nfc_hash, audio_fingerprint):
         """Encrypt NFC hash using audio fingerprint"""
         
-        key_material = (audio_fingerprint + "NFC_MAPPING").encode()
-        kdf = PBKDF2HMAC(
-            algorithm=hashes.SHA256(),
-            length=32,
-            salt=b'NFC_AUDIO_MAPPING',
-            iterations=50000,
-        )
-        key = base64.urlsafe_b64encode(kdf.derive(key_material))
-        cipher = Fernet(key)
+        nfc_key, _ = derive_mapping_keys(audio_fingerprint)
+        cipher = Fernet(nfc_key)
         
         return cipher.encrypt(nfc_hash.encode()).decode()
     
     def encrypt_chaos_mapping(self, chaos_value, audio_fingerprint):
         """Encrypt chaos value using audio fingerprint"""
         
-        key_material = (audio_fingerprint + "CHAOS_MAPPING").encode()
-        kdf = PBKDF2HMAC(
-            algorithm=hashes.SHA256(),
-            length=32,
-            salt=b'CHAOS_AUDIO_MAPPING',
-            iterations=50000,
-        )
-        key = base64.urlsafe_b64encode(kdf.derive(key_material))
-        cipher = Fernet(key)
+        _, chaos_key = derive_mapping_keys(audio_fingerprint)
+        cipher = Fernet(chaos_key)
         
         return cipher.encrypt(str(chaos_value).encode()).decode()
     
@@ -210,10 +290,12 @@ class USBGroupedAudioSystem:
         
         encrypted_credentials = master_cipher.encrypt(json.dumps(credentials).encode())
         
+        # Ciphertext is stored in a sibling .bin file and hashed as raw bytes
         pack_container = {
-            'container_version': '1.0',
+            'container_version': '2.0',
             'pack_metadata': pack_metadata,
-            'encrypted_credentials': base64.b64encode(encrypted_credentials).decode(),
+            'credentials_file': f"pack_{pack_metadata['pack_id']}.bin",
+            'credentials_blake2b': hashlib.blake2b(encrypted_credentials, digest_size=32).hexdigest(),
             'grouping_required': True,
             'unlock_instructions': {
                 'step_1': 'Verify audio group integrity',
@@ -222,7 +304,16 @@ class USBGroupedAudioSystem:
             }
         }
         
-        return pack_container
+        return pack_container, encrypted_credentials
+    
+    def hash_credentials_file(self, credentials_file):
+        """Hash encrypted credentials blob directly from the mapped file (raw digest)"""
+        
+        with open(credentials_file, 'rb') as f:
+            if os.fstat(f.fileno()).st_size == 0:
+                return hashlib.blake2b(digest_size=32).digest()
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+                return hashlib.blake2b(mapped, digest_size=32).digest()
     
     def update_usb_group_manifest(self, pack_id, pack_metadata):
         """Update USB group manifest for pack recognition"""
@@ -296,10 +387,23 @@ class USBGroupedAudioSystem:
                 
                 audio_file = os.path.join(pack_dir, pack_data['pack_metadata']['audio_file'])
                 
+                # Container v2 keeps ciphertext in a sibling .bin file
+                if 'credentials_file' in pack_data:
+                    credentials_file = os.path.join(pack_dir, pack_data['credentials_file'])
+                    
+                    if not os.path.exists(credentials_file):
+                        print(f"❌ Pack {pack_id}: Credentials file missing")
+                        continue
+                    
+                    stored_digest = bytes.fromhex(pack_data['credentials_blake2b'])
+                    if not hmac.compare_digest(stored_digest, self.hash_credentials_file(credentials_file)):
+                        print(f"❌ Pack {pack_id}: Credentials hash mismatch")
+                        continue
+                
                 if os.path.exists(audio_file):
                     current_fingerprint = self.create_audio_fingerprint(audio_file)
                     
-                    if current_fingerprint == group_info['audio_fingerprint']:
+                    if digests_match(group_info['audio_fingerprint'], current_fingerprint):
                         print(f"✅ Pack {pack_id}: Audio group verified")
                         verified_groups.append(pack_id)
                     else:
@@ -338,22 +442,31 @@ class USBGroupedAudioSystem:
         with open(pack_file, 'r') as f:
             pack_data = json.load(f)
         
+        if InvisibleNFCScanner is None:
+            print("⚠️  NFC scanner not available - using demo mode")
+            return pack_data  # Demo mode
+        
         # NFC authentication
         try:
-            from invisible_nfc_scanner import InvisibleNFCScanner
-            scanner = InvisibleNFCScanner()
+            scanner = self.get_scanner()
             
             print(f"📟 Scan NFC to unlock pack {pack_id}...")
             nfc_hash = scanner.invisible_scan_simple()
             
+            # A cancelled or timed-out scan yields no hash at all
+            if not nfc_hash:
+                print("❌ NFC authentication failed")
+                return None
+            
             # Decrypt NFC mapping
             audio_fingerprint = pack_data['pack_metadata']['audio_fingerprint']
             decrypted_nfc = self.decrypt_nfc_mapping(
                 pack_data['pack_metadata']['nfc_hash_encrypted'], 
-                audio_fingerprint
+                audio_fingerprint,
+                pack_data['pack_metadata'].get('mapping_kdf', 'legacy')
             )
             
-            if decrypted_nfc == nfc_hash:
+            if hmac.compare_digest(decrypted_nfc.encode(), nfc_hash.encode()):
                 print("✅ NFC authentication successful")
                 print(f"🔓 Pack {pack_id} unlocked and ready for use")
                 return pack_data
@@ -361,24 +474,32 @@ class USBGroupedAudioSystem:
                 print("❌ NFC authentication failed")
                 return None
                 
-        except ImportError:
-            print("⚠️  NFC scanner not available - using demo mode")
-            return pack_data  # Demo mode
         except Exception as e:
             print(f"❌ Unlock error: {e}")
             return None
     
-    def decrypt_nfc_mapping(self, encrypted_nfc, audio_fingerprint):
+    def get_scanner(self):
+        """Return the cached NFC scanner, creating it on first use"""
+        
+        if self._scanner is None:
+            self._scanner = InvisibleNFCScanner()
+        return self._scanner
+    
+    def decrypt_nfc_mapping(self, encrypted_nfc, audio_fingerprint, mapping_kdf='root-hkdf'):
         """Decrypt NFC mapping using audio fingerprint"""
         
-        key_material = (audio_fingerprint + "NFC_MAPPING").encode()
-        kdf = PBKDF2HMAC(
-            algorithm=hashes.SHA256(),
-            length=32,
-            salt=b'NFC_AUDIO_MAPPING',
-            iterations=50000,
-        )
-        key = base64.urlsafe_b64encode(kdf.derive(key_material))
+        if mapping_kdf == 'root-hkdf':
+            key, _ = derive_mapping_keys(audio_fingerprint)
+        else:
+            # Legacy packs derived each mapping key independently
+            key_material = (audio_fingerprint + "NFC_MAPPING").encode()
+            kdf = PBKDF2HMAC(
+                algorithm=hashes.SHA256(),
+                length=32,
+                salt=b'NFC_AUDIO_MAPPING',
+                iterations=50000,
+            )
+            key = base64.urlsafe_b64encode(kdf.derive(key_material))
         cipher = Fernet(key)
         
         return cipher.decrypt(encrypted_nfc.encode()).decode()
@@ -412,9 +533,7 @@ def main():
             
             print("\n📟 Scan NFC for pack binding...")
             try:
-                from invisible_nfc_scanner import InvisibleNFCScanner
-                scanner = InvisibleNFCScanner()
-                nfc_hash = scanner.invisible_scan_simple()
+                nfc_hash = system.get_scanner().invisible_scan_simple()
             except:
                 nfc_hash = f"demo_nfc_{pack_id}"
                 print("⚠️  Using demo NFC hash")
@@ -9,24 +9,134 @@ import re
 import hashlib
 import json
 import os
+import functools
+import plistlib
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+# Hardware identifier lines in system_profiler SPUSBDataType output
+_HW_KV_RE = re.compile(
+    r'^[ \t]*(Product ID|Vendor ID|Serial Number|Version|Manufacturer|'
+    r'Location ID|BSD Name|Capacity):[ \t]*(.*)$', re.M)
+
+_VENDOR_RE = re.compile(r'(0x[0-9a-fA-F]+)\s*(?:\((.*?)\))?')
+
+_HW_FIELD_NAMES = {
+    'Product ID': 'product_id',
+    'Serial Number': 'serial_number',
+    'Version': 'version',
+    'Manufacturer': 'manufacturer',
+    'Location ID': 'location_id',
+    'BSD Name': 'bsd_name',
+}
+
+def fingerprint_fields(fields, hasher=None):
+    """Feed sorted key/value pairs into BLAKE2b as length-prefixed bytes"""
+    
+    if hasher is None:
+        hasher = hashlib.blake2b(digest_size=32)
+    
+    for key in sorted(fields):
+        key_bytes = key.encode()
+        value_bytes = str(fields[key]).encode()
+        hasher.update(len(key_bytes).to_bytes(2, 'little') + key_bytes +
+                      len(value_bytes).to_bytes(4, 'little') + value_bytes)
+    
+    return hasher
+
+def _extract_hardware_identifiers(device_block):
+    """Extract hardware identifiers from device section"""
+    
+    identifiers = {}
+    
+    for key, value in _HW_KV_RE.findall(device_block):
+        value = value.strip()
+        
+        # Extract key hardware identifiers
+        if key == 'Vendor ID':
+            vendor_match = _VENDOR_RE.match(value)
+            if vendor_match:
+                identifiers['vendor_id'] = vendor_match.group(1)
+                if vendor_match.group(2):
+                    identifiers['vendor_name'] = vendor_match.group(2)
+        elif key == 'Capacity':
+            if 'GB' in value:
+                identifiers['capacity'] = value
+        else:
+            identifiers[_HW_FIELD_NAMES[key]] = value
+    
+    return identifiers if identifiers else None
+
+@functools.lru_cache(maxsize=16)
+def _parse_usb_device_info(usb_info, volume_name):
+    """Parse system_profiler output to find the device holding volume_name"""
+    
+    # Look for our volume in the output
+    volume_idx = usb_info.find(volume_name + ':')
+    if volume_idx == -1:
+        return None
+    
+    # Work backwards to find the parent USB device
+    product_idx = usb_info.rfind('Product ID:', 0, volume_idx)
+    if product_idx == -1:
+        return None
+    device_start = usb_info.rfind('\n', 0, product_idx) + 1
+    
+    # Device name is the nearest heading above the Product ID line
+    device_name = 'Unknown'
+    for line in reversed(usb_info[:device_start].rsplit('\n', 10)[-10:]):
+        if line.strip() and ':' in line and 'Product ID' not in line:
+            device_name = line.strip().rstrip(':')
+            break
+    
+    # Device section runs to 20 lines past the volume entry
+    device_end = volume_idx
+    for _ in range(20):
+        device_end = usb_info.find('\n', device_end + 1)
+        if device_end == -1:
+            device_end = len(usb_info)
+            break
+    
+    # Extract hardware identifiers
+    hardware_ids = _extract_hardware_identifiers(usb_info[device_start:device_end])
+    if hardware_ids:
+        hardware_ids['device_name'] = device_name
+        return hardware_ids
+    
+    return None
 
 class USBHardwareBinding:
     """Bind to USB hardware identifiers that survive wiping"""
     
     def __init__(self):
         self.hardware_identifiers = None
+        self._usb_info_cache = None  # (monotonic timestamp, system_profiler stdout)
+        self.usb_info_ttl = 2.0
+        
+    def get_system_usb_info(self):
+        """Return system_profiler USB output, reusing it within the TTL window"""
+        
+        if self._usb_info_cache is not None:
+            timestamp, usb_info = self._usb_info_cache
+            if time.monotonic() - timestamp < self.usb_info_ttl:
+                return usb_info
+        
+        result = subprocess.run(['system_profiler', 'SPUSBDataType'], 
+                              stdout=subprocess.PIPE, stderr=subprocess.DEVNULL, bufsize=-1)
+        usb_info = result.stdout.decode('utf-8', 'replace')
         
-    def get_usb_hardware_fingerprint(self, mount_path):
+        self._usb_info_cache = (time.monotonic(), usb_info)
+        return usb_info
+    
+    def get_usb_hardware_fingerprint(self, mount_path, usb_info=None):
         """Extract hardware identifiers that survive wiping"""
         
         print(f"🔍 Extracting hardware identifiers for: {mount_path}")
         
-        # Get system USB info
+        # Get system USB info unless the caller already fetched it
         try:
-            result = subprocess.run(['system_profiler', 'SPUSBDataType'], 
-                                  capture_output=True, text=True)
-            
-            usb_info = result.stdout
+            if usb_info is None:
+                usb_info = self.get_system_usb_info()
             
             # Find our specific USB device by mount path
             device_info = self.parse_usb_device_info(usb_info, mount_path)
@@ -51,66 +161,14 @@ class USBHardwareBinding:
         # Extract the volume name from mount path
         volume_name = os.path.basename(mount_path)
         
-        lines = usb_info.split('\n')
-        device_section = None
-        current_device = {}
-        in_target_device = False
-        
-        for i, line in enumerate(lines):
-            # Look for our volume in the output
-            if volume_name + ':' in line:
-                # Work backwards to find the parent USB device
-                for j in range(i, 0, -1):
-                    if 'Product ID:' in lines[j]:
-                        # Found the device section, extract all relevant info
-                        device_start = j
-                        # Go back further to get device name
-                        for k in range(j, max(0, j-10), -1):
-                            if lines[k].strip() and ':' in lines[k] and 'Product ID' not in lines[k]:
-                                device_name = lines[k].strip().rstrip(':')
-                                break
-                        
-                        # Extract hardware identifiers
-                        hardware_ids = self.extract_hardware_identifiers(lines, device_start, i)
-                        if hardware_ids:
-                            hardware_ids['device_name'] = device_name
-                            return hardware_ids
-                        break
-                break
-        
-        return None
+        # Parsing is memoized; copy so callers can't mutate the cached result
+        hardware_ids = _parse_usb_device_info(usb_info, volume_name)
+        return dict(hardware_ids) if hardware_ids else None
     
-    def extract_hardware_identifiers(self, lines, start_idx, end_idx):
+    def extract_hardware_identifiers(self, device_block):
         """Extract hardware identifiers from device section"""
         
-        identifiers = {}
-        
-        for i in range(start_idx, min(end_idx + 20, len(lines))):
-            line = lines[i].strip()
-            
-            # Extract key hardware identifiers
-            if 'Product ID:' in line:
-                identifiers['product_id'] = line.split('Product ID:')[1].strip()
-            elif 'Vendor ID:' in line:
-                vendor_match = re.search(r'Vendor ID:\s*(0x[0-9a-fA-F]+)\s*(?:\((.*?)\))?', line)
-                if vendor_match:
-                    identifiers['vendor_id'] = vendor_match.group(1)
-                    if vendor_match.group(2):
-                        identifiers['vendor_name'] = vendor_match.group(2)
-            elif 'Serial Number:' in line:
-                identifiers['serial_number'] = line.split('Serial Number:')[1].strip()
-            elif 'Version:' in line:
-                identifiers['version'] = line.split('Version:')[1].strip()
-            elif 'Manufacturer:' in line:
-                identifiers['manufacturer'] = line.split('Manufacturer:')[1].strip()
-            elif 'Location ID:' in line:
-                identifiers['location_id'] = line.split('Location ID:')[1].strip()
-            elif 'BSD Name:' in line:
-                identifiers['bsd_name'] = line.split('BSD Name:')[1].strip()
-            elif 'Capacity:' in line and 'GB' in line:
-                identifiers['capacity'] = line.split('Capacity:')[1].strip()
-        
-        return identifiers if identifiers else None
+        return _extract_hardware_identifiers(device_block)
     
     def create_hardware_fingerprint(self, hardware_ids):
         """Create fingerprint from hardware identifiers"""
@@ -130,8 +188,7 @@ class USBHardwareBinding:
         }
         
         # Create composite fingerprint
-        fingerprint_data = str(sorted(persistent_identifiers.items()))
-        hardware_fingerprint = hashlib.sha256(fingerprint_data.encode()).hexdigest()
+        hardware_fingerprint = fingerprint_fields(persistent_identifiers).hexdigest()
         
         print(f"🔒 Hardware Fingerprint Components:")
         for key, value in persistent_identifiers.items():
@@ -142,7 +199,7 @@ class USBHardwareBinding:
         
         return hardware_fingerprint, persistent_identifiers
     
-    def test_hardware_binding(self, mount_path):
+    def test_hardware_binding(self, mount_path, usb_info=None):
         """Test hardware binding for a USB device"""
         
         print(f"🧪 TESTING USB HARDWARE BINDING")
@@ -150,7 +207,7 @@ class USBHardwareBinding:
         print("=" * 50)
         
         # Get hardware identifiers
-        hardware_ids = self.get_usb_hardware_fingerprint(mount_path)
+        hardware_ids = self.get_usb_hardware_fingerprint(mount_path, usb_info)
         
         if not hardware_ids:
             print("❌ Failed to extract hardware identifiers")
@@ -179,8 +236,22 @@ class USBHardwareBinding:
         print(f"🔒 ENHANCED USB BINDING")
         print("=" * 30)
         
+        # Run system_profiler and diskutil concurrently
+        with ThreadPoolExecutor(max_workers=2) as executor:
+            usb_info_future = executor.submit(self.get_system_usb_info)
+            diskutil_future = executor.submit(subprocess.run, ['diskutil', 'info', '-plist', mount_path], 
+                                              stdout=subprocess.PIPE, stderr=subprocess.DEVNULL, bufsize=-1)
+            try:
+                usb_info = usb_info_future.result()
+            except (OSError, subprocess.SubprocessError):
+                usb_info = None
+            try:
+                diskutil_output = diskutil_future.result().stdout
+            except (OSError, subprocess.SubprocessError):
+                diskutil_output = b''
+        
         # Get hardware identifiers (survive wiping)
-        hardware_result = self.test_hardware_binding(mount_path)
+        hardware_result = self.test_hardware_binding(mount_path, usb_info)
         
         if not hardware_result:
             return None
@@ -188,17 +259,17 @@ class USBHardwareBinding:
         hardware_fingerprint, hardware_ids = hardware_result
         
         # Get filesystem identifiers (current state)
-        diskutil_result = subprocess.run(['diskutil', 'info', mount_path], 
-                                       capture_output=True, text=True)
+        try:
+            disk_info = plistlib.loads(diskutil_output)
+        except Exception:
+            disk_info = {}
         
         filesystem_info = {}
-        for line in diskutil_result.stdout.split('\n'):
-            if 'Volume UUID' in line:
-                filesystem_info['volume_uuid'] = line.split(':')[1].strip()
-            elif 'File System Personality' in line:
-                filesystem_info['filesystem'] = line.split(':')[1].strip()
-            elif 'Mount Point' in line:
-                filesystem_info['mount_point'] = line.split(':')[1].strip()
+        for plist_key, info_key in (('VolumeUUID', 'volume_uuid'),
+                                    ('FilesystemName', 'filesystem'),
+                                    ('MountPoint', 'mount_point')):
+            if disk_info.get(plist_key):
+                filesystem_info[info_key] = disk_info[plist_key]
         
         # Create dual-layer binding
         enhanced_binding = {
@@ -211,8 +282,8 @@ class USBHardwareBinding:
                 'info': filesystem_info,
                 'persistence': 'current_session'
             },
-            'composite_fingerprint': hashlib.sha256(
-                (hardware_fingerprint + str(sorted(filesystem_info.items()))).encode()
+            'composite_fingerprint': fingerprint_fields(
+                filesystem_info, hashlib.blake2b(hardware_fingerprint.encode(), digest_size=32)
             ).hexdigest()
         }
         
@@ -6,16 +6,175 @@ Files become unusable if moved from origin USB
 """
 
 import hashlib
+import hmac
 import json
 import time
 import os
+import re
+import struct
 import subprocess
+import functools
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
 from cryptography.fernet import Fernet
 from cryptography.hazmat.primitives import hashes
 from cryptography.hazmat.primitives.kdf.pbkdf2 import PBKDF2HMAC
+from cryptography.hazmat.primitives.kdf.hkdf import HKDF
 import base64
 
+# Packs without a binding_kdf marker encrypt every field with the PBKDF2 key directly
+USB_BINDING_KDF = 'root-hkdf'
+
+# PBKDF2 work factors for new packs; each pack records the counts it was made with
+DEFAULT_KDF_ITERS = 600_000
+MIN_KDF_ITERS = 100_000
+
+def _kdf_iterations(env_name):
+    """Read a PBKDF2 count override, falling back to the default and never going below the floor"""
+    
+    value = os.environ.get(env_name)
+    if value is None:
+        return DEFAULT_KDF_ITERS
+    try:
+        return max(int(value), MIN_KDF_ITERS)
+    except ValueError:
+        print(f"⚠️ Ignoring invalid {env_name}={value!r}, using {DEFAULT_KDF_ITERS}")
+        return DEFAULT_KDF_ITERS
+
+USB_KDF_ITERS = _kdf_iterations('USB_KDF_ITERS')
+MASTER_KDF_ITERS = _kdf_iterations('MASTER_KDF_ITERS')
+
+# Packs that predate the recorded counts used these
+LEGACY_USB_KDF_ITERS = 50000
+
+# Fields hashed into a USB fingerprint, in fixed order
+USB_FINGERPRINT_FIELDS = ('device_name', 'filesystem', 'mount_point', 'total_size', 'volume_uuid')
+
+def usb_fingerprint_from_info(usb_info):
+    """Canonical USB fingerprint: length-prefixed key/value bytes in fixed field order"""
+    
+    hasher = hashlib.sha256()
+    for key in USB_FINGERPRINT_FIELDS:
+        value = str(usb_info.get(key, '')).encode()
+        hasher.update(struct.pack('>I', len(key)) + key.encode() + struct.pack('>I', len(value)) + value)
+    return hasher.hexdigest()
+
+def matching_usb_fingerprint(usb_info, required_fingerprint):
+    """Return the fingerprint format of usb_info that matches a pack, else the current format"""
+    
+    candidates = (
+        usb_fingerprint_from_info(usb_info),
+        # Packs made before the canonical format hashed the repr of the sorted items
+        hashlib.sha256(str(sorted(usb_info.items())).encode()).hexdigest(),
+    )
+    for fingerprint in candidates:
+        if hmac.compare_digest(fingerprint, required_fingerprint):
+            return fingerprint
+    
+    return candidates[0]
+
+def derive_usb_root_key(usb_fingerprint, iterations=LEGACY_USB_KDF_ITERS):
+    """Run the slow USB binding PBKDF2 once, yielding the raw root key"""
+    
+    # hashlib's PBKDF2 is one call into OpenSSL; output matches PBKDF2HMAC byte for byte
+    return hashlib.pbkdf2_hmac(
+        'sha256', (usb_fingerprint + "USB_BINDING").encode(), b'USB_SPECIFIC_BINDING', iterations, dklen=32
+    )
+
+@functools.lru_cache(maxsize=8)
+def usb_field_cipher(usb_root_key, field):
+    """Expand the USB root key into a per-field Fernet cipher with HKDF"""
+    
+    field_key = HKDF(
+        algorithm=hashes.SHA256(),
+        length=32,
+        salt=b'USB_BINDING',
+        info=b'field-' + field.encode(),
+    ).derive(usb_root_key)
+    return Fernet(base64.urlsafe_b64encode(field_key))
+
+def usb_binding_ciphers(usb_fingerprint, binding_kdf=None, iterations=None):
+    """Return (nfc_cipher, chaos_cipher) for a pack's USB-bound fields"""
+    
+    usb_root_key = derive_usb_root_key(usb_fingerprint, iterations or LEGACY_USB_KDF_ITERS)
+    if binding_kdf == USB_BINDING_KDF:
+        return usb_field_cipher(usb_root_key, 'nfc_hash'), usb_field_cipher(usb_root_key, 'chaos')
+    
+    # Legacy packs used the PBKDF2 output as a single Fernet key for both fields
+    legacy_cipher = Fernet(base64.urlsafe_b64encode(usb_root_key))
+    return legacy_cipher, legacy_cipher
+
+# Value runs to the next colon, as the old line.split(':')[1] parse did
+_DISKUTIL_RE = re.compile(
+    r'^[^:\n]*(Volume UUID|Device / Media Name|Total Size|File System Personality)[^:\n]*:([^:\n]*)',
+    re.MULTILINE,
+)
+
+@functools.lru_cache(maxsize=32)
+def _probe_diskutil(usb_path):
+    """Run diskutil once per USB path; returns (volume_uuid, device_name, total_size, filesystem)"""
+    
+    result = subprocess.run(['diskutil', 'info', usb_path], 
+                          capture_output=True, text=True)
+    
+    fields = {key: value.strip() for key, value in _DISKUTIL_RE.findall(result.stdout)}
+    
+    return (
+        fields.get('Volume UUID'),
+        fields.get('Device / Media Name'),
+        fields.get('Total Size'),
+        fields.get('File System Personality'),
+    )
+
+def probe_usb_info(usb_path):
+    """USB fingerprint fields for a mount point; pack creation and verification share this parse"""
+    
+    usb_info = {}
+    for key, value in zip(('volume_uuid', 'device_name', 'total_size', 'filesystem'), _probe_diskutil(usb_path)):
+        if value is not None:
+            usb_info[key] = value
+    
+    # Add mount point info (use stable characteristics only)
+    usb_info['mount_point'] = usb_path
+    return usb_info
+
+# Probed USB info persists across runs; entries are keyed by mount point
+USB_CACHE_PATH = os.path.expanduser('~/.cache/nfc-github-2fa/usb_fingerprints.json')
+
+def _volume_stamp(usb_path):
+    """Cheap identity for a mounted volume: size plus root inode and birth time"""
+    
+    st = os.stat(usb_path)
+    vfs = os.statvfs(usb_path)
+    return [vfs.f_blocks, vfs.f_frsize, st.st_ino, getattr(st, 'st_birthtime', st.st_ctime)]
+
+def _load_usb_cache():
+    """Read the on-disk USB info cache"""
+    
+    try:
+        with open(USB_CACHE_PATH, 'rb') as f:
+            return json.loads(f.read())
+    except (OSError, ValueError):
+        return {}
+
+def _save_usb_cache(cache):
+    """Write the on-disk USB info cache"""
+    
+    try:
+        os.makedirs(os.path.dirname(USB_CACHE_PATH), exist_ok=True)
+        tmp_path = f"{USB_CACHE_PATH}.{os.getpid()}.tmp"
+        with open(tmp_path, 'w') as f:
+            json.dump(cache, f)
+        os.replace(tmp_path, USB_CACHE_PATH)
+    except OSError:
+        pass
+
+# Repeated scans within one workflow reuse the last /Volumes listing
+MOUNT_CACHE_SECONDS = 1.0
+
+# Chaos values are truncated to 32 bits
+CHAOS_MASK = 0xFFFFFFFF
+
 class USBOriginCaptureSystem:
     """Capture system that binds files to origin USB drive"""
     
@@ -23,6 +182,11 @@ class USBOriginCaptureSystem:
         self.usb_mount_points = ["/Volumes", "/media", "/mnt"]
         self.detected_usb = None
         self.usb_fingerprint = None
+        self._volumes_snapshot = None
+        self._usb_root_key = None
+        self._usb_fingerprint_bytes = None
+        self._usb_cache = None
+        self._mounts_cache = None
         
     def detect_usb_drives(self):
         """Detect available USB drives"""
@@ -33,11 +197,34 @@ class USBOriginCaptureSystem:
         try:
             # macOS - check /Volumes
             volumes_dir = "/Volumes"
-            if os.path.exists(volumes_dir):
-                for item in os.listdir(volumes_dir):
-                    volume_path = os.path.join(volumes_dir, item)
-                    if os.path.ismount(volume_path) and item != "Macintosh HD":
-                        usb_drives.append(volume_path)
+            now = time.monotonic()
+            if self._mounts_cache and now - self._mounts_cache[0] < MOUNT_CACHE_SECONDS:
+                usb_drives = list(self._mounts_cache[1])
+            elif os.path.exists(volumes_dir):
+                entries = list(os.scandir(volumes_dir))
+                
+                # Drop cached diskutil probes when drives come or go
+                snapshot = tuple(sorted(entry.name for entry in entries))
+                if snapshot != self._volumes_snapshot:
+                    _probe_diskutil.cache_clear()
+                    self._volumes_snapshot = snapshot
+                
+                # A mount point sits on a different device than /Volumes itself,
+                # so stat the parent once instead of twice per entry via ismount
+                parent_dev = os.stat(volumes_dir).st_dev
+                for entry in entries:
+                    # Hidden/system entries and plain files can't be drives; d_type makes this free
+                    if entry.name.startswith('.') or entry.name == "Macintosh HD":
+                        continue
+                    if entry.is_symlink() or not entry.is_dir(follow_symlinks=False):
+                        continue
+                    try:
+                        if entry.stat(follow_symlinks=False).st_dev != parent_dev:
+                            usb_drives.append(entry.path)
+                    except OSError:
+                        continue
+                
+                self._mounts_cache = (now, tuple(usb_drives))
         except:
             pass
         
@@ -54,27 +241,23 @@ class USBOriginCaptureSystem:
         """Create unique fingerprint for USB drive"""
         
         try:
-            # Get filesystem information
-            result = subprocess.run(['diskutil', 'info', usb_path], 
-                                  capture_output=True, text=True)
+            # Reuse probed info from earlier runs while the same volume is mounted here
+            stamp = _volume_stamp(usb_path)
+            usb_cache = _load_usb_cache()
+            cached = usb_cache.get(usb_path)
             
-            usb_info = {}
-            for line in result.stdout.split('\n'):
-                if 'Volume UUID' in line:
-                    usb_info['volume_uuid'] = line.split(':')[1].strip()
-                elif 'Device / Media Name' in line:
-                    usb_info['device_name'] = line.split(':')[1].strip()
-                elif 'Total Size' in line:
-                    usb_info['total_size'] = line.split(':')[1].strip()
-                elif 'File System Personality' in line:
-                    usb_info['filesystem'] = line.split(':')[1].strip()
-            
-            # Add mount point info (use stable characteristics only)
-            usb_info['mount_point'] = usb_path
+            if cached and cached['stamp'] == stamp:
+                usb_info = cached['usb_info']
+            else:
+                # Get filesystem information (cached per USB path)
+                usb_info = probe_usb_info(usb_path)
+                
+                if 'volume_uuid' in usb_info:
+                    usb_cache[usb_path] = {'stamp': stamp, 'usb_info': usb_info}
+                    _save_usb_cache(usb_cache)
             
             # Create composite fingerprint
-            fingerprint_data = str(sorted(usb_info.items()))
-            usb_fingerprint = hashlib.sha256(fingerprint_data.encode()).hexdigest()
+            usb_fingerprint = usb_fingerprint_from_info(usb_info)
             
             print(f"✅ USB fingerprint created: {usb_fingerprint[:16]}...")
             return usb_fingerprint, usb_info
@@ -90,6 +273,20 @@ class USBOriginCaptureSystem:
             fallback_fingerprint = hashlib.sha256(str(fallback_info).encode()).hexdigest()
             return fallback_fingerprint, fallback_info
     
+    def _get_usb_state(self, usb_path):
+        """Fingerprint, info and root key for a drive, cached until /Volumes changes"""
+        
+        if self._usb_cache is None or self._usb_cache[0] != self._volumes_snapshot:
+            self._usb_cache = (self._volumes_snapshot, {})
+        
+        usb_states = self._usb_cache[1]
+        if usb_path not in usb_states:
+            usb_fingerprint, usb_info = self.create_usb_fingerprint(usb_path)
+            usb_root_key = derive_usb_root_key(usb_fingerprint, USB_KDF_ITERS)
+            usb_states[usb_path] = (usb_fingerprint, usb_info, usb_root_key)
+        
+        return usb_states[usb_path]
+    
     def select_usb_drive(self):
         """Let user select USB drive for origin binding"""
         
@@ -114,8 +311,9 @@ class USBOriginCaptureSystem:
                 except:
                     print("❌ Invalid input")
         
-        # Create USB fingerprint
-        self.usb_fingerprint, usb_info = self.create_usb_fingerprint(selected_usb)
+        # Create USB fingerprint (reused across workflow runs while /Volumes is unchanged)
+        self.usb_fingerprint, usb_info, self._usb_root_key = self._get_usb_state(selected_usb)
+        self._usb_fingerprint_bytes = bytes.fromhex(self.usb_fingerprint)
         self.detected_usb = selected_usb
         
         print(f"🔒 USB origin selected: {selected_usb}")
@@ -150,14 +348,23 @@ class USBOriginCaptureSystem:
         original_output_dir = recorder.output_dir
         recorder.output_dir = pack_dir
         
+        # The recording is written once to slow USB flash; caching it only evicts hotter data
+        recorder.bypass_page_cache = True
+        
         audio_file = recorder.record_song(audio_filename)
         
         # Restore original directory
         recorder.output_dir = original_output_dir
         
-        if audio_file and os.path.exists(audio_path):
+        # One stat on the USB both confirms the file and that it is non-empty
+        try:
+            recorded = bool(audio_file) and os.stat(audio_path).st_size > 0
+        except FileNotFoundError:
+            recorded = False
+        
+        if recorded:
             print(f"✅ Audio recorded to USB: {audio_filename}")
-            return audio_path
+            return audio_path, audio_filename
         else:
             print("❌ USB audio recording failed")
             return None
@@ -173,20 +380,23 @@ class USBOriginCaptureSystem:
             sdr.sample_rate = 2.048e6
             sdr.center_freq = 433.92e6
             
-            # Live RF sampling
-            rf_samples = sdr.read_samples(204800)
+            # Live RF sampling: raw interleaved 8-bit I/Q, skipping the complex128 conversion
+            raw_iq = sdr.read_bytes(409600)
             sdr.close()
             
             # Convert to chaos value
             import numpy as np
-            chaos_int = int(np.mean(np.abs(rf_samples)) * 1000000) % (2**32)
+            raw_iq = np.frombuffer(raw_iq, dtype=np.uint8)
+            
+            # Variance ignores the 127.5 offset, so scaling by 127.5**2 matches normalized I/Q
+            chaos_int = int(raw_iq.var() * 1e9 / (127.5 ** 2)) & CHAOS_MASK
             
             print(f"   ✅ Live chaos captured: {chaos_int}")
             return chaos_int
             
         except Exception as e:
             print(f"   NESDR not available: {e}")
-            # Use system entropy
+            # Use system entropy (4 bytes is already within CHAOS_MASK)
             chaos_fallback = int.from_bytes(os.urandom(4), 'big')
             print(f"   ✅ System chaos: {chaos_fallback}")
             return chaos_fallback
@@ -212,9 +422,12 @@ class USBOriginCaptureSystem:
             print(f"❌ NFC seal failed: {e}")
             return None
     
-    def create_usb_bound_pack(self, pack_id, audio_path, chaos_value, nfc_hash):
+    def create_usb_bound_pack(self, pack_id, audio_path, chaos_value, nfc_hash, audio_filename=None):
         """Create encryption pack bound to specific USB"""
         
+        if audio_filename is None:
+            audio_filename = os.path.basename(audio_path)
+        
         print("\n🔒 CREATING USB-BOUND ENCRYPTION PACK")
         print("-" * 40)
         
@@ -232,23 +445,31 @@ class USBOriginCaptureSystem:
             'pack_id': pack_id,
             'pack_type': 'usb_origin_bound',
             'creation_time': time.time(),
-            'audio_file': os.path.basename(audio_path),
+            'audio_file': audio_filename,
             'usb_binding': usb_binding,
-            'nfc_hash_encrypted': self.encrypt_with_usb_binding(nfc_hash),
-            'chaos_encrypted': self.encrypt_with_usb_binding(str(chaos_value))
+            'binding_kdf': USB_BINDING_KDF,
+            'usb_kdf_iterations': USB_KDF_ITERS,
+            'master_kdf_iterations': MASTER_KDF_ITERS,
+            'nfc_hash_encrypted': self.encrypt_with_usb_binding(nfc_hash, 'nfc_hash'),
+            'chaos_encrypted': self.encrypt_with_usb_binding(str(chaos_value), 'chaos')
         }
         
-        # Create master encryption key
-        master_key_material = (
-            nfc_hash + str(chaos_value) + self.usb_fingerprint + 
-            os.path.basename(audio_path)
-        ).encode()
+        # Create master encryption key (raw fingerprint digest; hex is for display)
+        if self._usb_fingerprint_bytes is None:
+            self._usb_fingerprint_bytes = bytes.fromhex(self.usb_fingerprint)
+        
+        master_key_material = b''.join([
+            nfc_hash.encode(),
+            str(chaos_value).encode(),
+            self._usb_fingerprint_bytes,
+            audio_filename.encode(),
+        ])
         
         master_kdf = PBKDF2HMAC(
             algorithm=hashes.SHA256(),
             length=32,
             salt=b'USB_ORIGIN_MASTER_KEY',
-            iterations=100000,
+            iterations=MASTER_KDF_ITERS,
         )
         master_key = base64.urlsafe_b64encode(master_kdf.derive(master_key_material))
         master_cipher = Fernet(master_key)
@@ -280,8 +501,12 @@ class USBOriginCaptureSystem:
         pack_dir = os.path.dirname(audio_path)
         pack_file = os.path.join(pack_dir, f"usb_origin_pack_{pack_id}.json")
         
-        with open(pack_file, 'w') as f:
-            json.dump(pack_container, f, indent=2)
+        # Serialize up front so the slow USB sees one write of the whole pack
+        pack_bytes = json.dumps(pack_container, indent=2).encode()
+        with open(pack_file, 'wb', buffering=0) as f:
+            view = memoryview(pack_bytes)
+            while view:
+                view = view[f.write(view):]
         
         print(f"✅ USB-bound pack created: {pack_file}")
         print(f"   🔒 Bound to USB: {self.usb_fingerprint[:16]}...")
@@ -290,20 +515,13 @@ class USBOriginCaptureSystem:
         
         return pack_container, pack_file
     
-    def encrypt_with_usb_binding(self, data):
-        """Encrypt data with USB-specific key"""
+    def encrypt_with_usb_binding(self, data, field):
+        """Encrypt data with a per-field key expanded from the USB root key"""
         
-        usb_key_material = (self.usb_fingerprint + "USB_BINDING").encode()
-        usb_kdf = PBKDF2HMAC(
-            algorithm=hashes.SHA256(),
-            length=32,
-            salt=b'USB_SPECIFIC_BINDING',
-            iterations=50000,
-        )
-        usb_key = base64.urlsafe_b64encode(usb_kdf.derive(usb_key_material))
-        usb_cipher = Fernet(usb_key)
+        if self._usb_root_key is None:
+            self._usb_root_key = derive_usb_root_key(self.usb_fingerprint, USB_KDF_ITERS)
         
-        return usb_cipher.encrypt(data.encode()).decode()
+        return usb_field_cipher(self._usb_root_key, field).encrypt(data.encode()).decode()
     
     def run_complete_capture_workflow(self):
         """Run complete capture workflow with USB origin binding"""
@@ -323,13 +541,16 @@ class USBOriginCaptureSystem:
         print(f"\n📦 Creating Pack: {pack_id}")
         print(f"🔒 USB Origin: {self.detected_usb}")
         
-        # Step 2: Record audio directly to USB
-        audio_path = self.record_audio_to_usb(pack_id)
-        if not audio_path:
-            return None
+        # Steps 2-3: Record audio to USB while sampling chaos (separate hardware)
+        with ThreadPoolExecutor(max_workers=2) as executor:
+            audio_future = executor.submit(self.record_audio_to_usb, pack_id)
+            chaos_future = executor.submit(self.capture_chaos_value)
+            audio_result = audio_future.result()
+            chaos_value = chaos_future.result()
         
-        # Step 3: Capture chaos value
-        chaos_value = self.capture_chaos_value()
+        if not audio_result:
+            return None
+        audio_path, audio_filename = audio_result
         
         # Step 4: NFC seal scan
         nfc_hash = self.nfc_seal_scan()
@@ -338,7 +559,7 @@ class USBOriginCaptureSystem:
         
         # Step 5: Create USB-bound pack
         pack_container, pack_file = self.create_usb_bound_pack(
-            pack_id, audio_path, chaos_value, nfc_hash
+            pack_id, audio_path, chaos_value, nfc_hash, audio_filename
         )
         
         # Step 6: Verification
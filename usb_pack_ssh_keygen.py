@@ -8,15 +8,94 @@ Creates GitHub-ready SSH authentication from immovable pack
 import os
 import json
 import hashlib
-import base64
-import subprocess
+import wave
+import functools
 from datetime import datetime
-from cryptography.fernet import Fernet
-from cryptography.hazmat.primitives import hashes, serialization
-from cryptography.hazmat.primitives.kdf.pbkdf2 import PBKDF2HMAC
-from cryptography.hazmat.primitives.asymmetric import rsa
-import librosa
-import numpy as np
+from cryptography.hazmat.primitives import serialization
+from cryptography.hazmat.primitives.asymmetric.ed25519 import Ed25519PrivateKey
+from usb_origin_capture_system import matching_usb_fingerprint, probe_usb_info, usb_binding_ciphers
+
+# Fingerprints and KDFs expect OpenSSL's SHA-256 (SHA-NI / ARMv8 crypto), not the builtin fallback
+if hashlib.sha256.__module__ != '_hashlib':
+    print("⚠️  hashlib is not OpenSSL-backed - SHA-256 will run without hardware acceleration")
+
+# Host name for public key comments, looked up once
+_NODENAME = os.uname().nodename
+
+# Audio fingerprint analysis parameters (STFT frames, mel bands, cepstral coefficients)
+N_FFT = 2048
+HOP_LENGTH = 512
+N_MELS = 40
+N_MFCC = 13
+
+# Samples decoded per read when streaming pack audio
+AUDIO_BLOCK_FRAMES = 65536
+
+def _pcm_to_float(raw, sample_width):
+    """Decode little-endian PCM WAV frames to float32 in [-1, 1)"""
+    
+    import numpy as np
+    
+    if sample_width == 1:
+        return (np.frombuffer(raw, dtype=np.uint8).astype(np.float32) - 128.0) / 128.0
+    
+    dtype = {2: '<i2', 4: '<i4'}[sample_width]
+    return np.frombuffer(raw, dtype=dtype).astype(np.float32) / float(2 ** (8 * sample_width - 1))
+
+def _mel_filterbank(sr, n_fft, n_mels):
+    """Triangular mel filterbank mapping rfft bins to mel bands"""
+    
+    import numpy as np
+    
+    mel_max = 2595.0 * np.log10(1.0 + (sr / 2.0) / 700.0)
+    band_hz = 700.0 * (10.0 ** (np.linspace(0.0, mel_max, n_mels + 2) / 2595.0) - 1.0)
+    fft_freqs = np.fft.rfftfreq(n_fft, 1.0 / sr)
+    
+    lower, center, upper = band_hz[:-2, None], band_hz[1:-1, None], band_hz[2:, None]
+    rising = (fft_freqs - lower) / (center - lower)
+    falling = (upper - fft_freqs) / (upper - center)
+    return np.maximum(0.0, np.minimum(rising, falling))
+
+def _dct_basis(n_in, n_out):
+    """Orthonormal DCT-II basis, rows are the first n_out coefficients"""
+    
+    import numpy as np
+    
+    basis = np.cos(np.pi / n_in * (np.arange(n_in) + 0.5) * np.arange(n_out)[:, None])
+    basis *= np.sqrt(2.0 / n_in)
+    basis[0] /= np.sqrt(2.0)
+    return basis
+
+@functools.lru_cache(maxsize=4)
+def _feature_tables(sr):
+    """float32 (hann window, mel filterbank, DCT basis, bin frequencies), built once per sample rate"""
+    
+    import numpy as np
+    
+    return (
+        np.hanning(N_FFT).astype(np.float32),
+        _mel_filterbank(sr, N_FFT, N_MELS).astype(np.float32),
+        _dct_basis(N_MELS, N_MFCC).astype(np.float32),
+        np.fft.rfftfreq(N_FFT, 1.0 / sr).astype(np.float32),
+    )
+
+def _frame_feature_sums(samples, tables):
+    """STFT every full frame of samples; returns (per-coefficient MFCC sums, centroid sum, frame count)"""
+    
+    import numpy as np
+    
+    hann, mel_fb, dct, freqs = tables
+    
+    # Blocked STFT: every windowed frame goes through a single rfft call
+    frames = np.lib.stride_tricks.sliding_window_view(samples, N_FFT)[::HOP_LENGTH]
+    magnitude = np.abs(np.fft.rfft(frames * hann, axis=1)).astype(np.float32, copy=False)
+    power = magnitude ** 2
+    
+    mel_power = mel_fb @ power.T
+    mfccs = dct @ (10.0 * np.log10(np.maximum(mel_power, 1e-10)))
+    spectral_centroid = (magnitude * freqs).sum(axis=1) / np.maximum(magnitude.sum(axis=1), 1e-10)
+    
+    return mfccs.sum(axis=1, dtype=np.float64), float(spectral_centroid.sum(dtype=np.float64)), len(frames)
 
 class USBPackSSHKeyGen:
     """Generate SSH keys from USB-origin authentication pack"""
@@ -26,9 +105,26 @@ class USBPackSSHKeyGen:
         self.selected_usb = None
         self.pack_container = None
         self.ssh_keys_dir = os.path.expanduser("~/.ssh")
-        
+        self._pack_cache = {}
+        
+    def _scan_pack(self, pack_path):
+        """One scandir pass per pack directory; returns (audio_files, json_files) as full paths"""
+        
+        if pack_path not in self._pack_cache:
+            audio_files = []
+            json_files = []
+            with os.scandir(pack_path) as entries:
+                for entry in entries:
+                    if entry.name.endswith('.wav'):
+                        audio_files.append(entry.path)
+                    elif entry.name.endswith('.json'):
+                        json_files.append(entry.path)
+            self._pack_cache[pack_path] = (audio_files, json_files)
+        
+        return self._pack_cache[pack_path]
+    
     def detect_usb_drives(self):
-        """Find available USB drives with MobileShield packs"""
+        """Find available USB drives with MobileShield packs; returns [(drive, pack_names), ...]"""
         
         print("🔍 Scanning for USB drives with MobileShield packs...")
         usb_drives = []
@@ -36,22 +132,34 @@ class USBPackSSHKeyGen:
         try:
             volumes_dir = "/Volumes"
             if os.path.exists(volumes_dir):
-                for item in os.listdir(volumes_dir):
-                    volume_path = os.path.join(volumes_dir, item)
-                    if os.path.ismount(volume_path) and item != "Macintosh HD":
-                        # Check for MobileShield packs
-                        pack_dir = os.path.join(volume_path, "MobileShield_Packs")
-                        if os.path.exists(pack_dir):
-                            usb_drives.append(volume_path)
+                # A mount point sits on a different device than /Volumes; the system
+                # volume's entry ("Macintosh HD") is a symlink to / and is skipped as such
+                parent_dev = os.stat(volumes_dir).st_dev
+                with os.scandir(volumes_dir) as entries:
+                    for entry in entries:
+                        if entry.name.startswith('.') or entry.is_symlink():
+                            continue
+                        # One unreadable or unmounting volume must not end the whole scan
+                        try:
+                            if not entry.is_dir(follow_symlinks=False):
+                                continue
+                            if entry.stat(follow_symlinks=False).st_dev == parent_dev:
+                                continue
+                            
+                            # Check for MobileShield packs, listing them in the same pass
+                            pack_dir = os.path.join(entry.path, "MobileShield_Packs")
+                            with os.scandir(pack_dir) as pack_entries:
+                                packs = [p.name for p in pack_entries if p.name.startswith("pack_")]
+                        except OSError:
+                            continue
+                        usb_drives.append((entry.path, packs))
         except:
             pass
         
         if usb_drives:
             print(f"📁 Found USB drives with packs:")
-            for i, drive in enumerate(usb_drives):
-                pack_count = len([d for d in os.listdir(os.path.join(drive, "MobileShield_Packs")) 
-                                if d.startswith("pack_")])
-                print(f"   {i+1}. {drive} ({pack_count} packs)")
+            for i, (drive, packs) in enumerate(usb_drives):
+                print(f"   {i+1}. {drive} ({len(packs)} packs)")
             return usb_drives
         else:
             print("❌ No USB drives with MobileShield packs found")
@@ -66,23 +174,22 @@ class USBPackSSHKeyGen:
             return False
         
         if len(self.usb_drives) == 1:
-            self.selected_usb = self.usb_drives[0]
+            self.selected_usb, packs = self.usb_drives[0]
             print(f"📌 Auto-selected USB: {self.selected_usb}")
         else:
             while True:
                 try:
                     choice = int(input("Select USB drive number: ")) - 1
                     if 0 <= choice < len(self.usb_drives):
-                        self.selected_usb = self.usb_drives[choice]
+                        self.selected_usb, packs = self.usb_drives[choice]
                         break
                     else:
                         print("❌ Invalid selection")
                 except:
                     print("❌ Invalid input")
         
-        # List available packs
+        # List available packs (enumerated during detection)
         pack_dir = os.path.join(self.selected_usb, "MobileShield_Packs")
-        packs = [d for d in os.listdir(pack_dir) if d.startswith("pack_")]
         
         if not packs:
             print("❌ No authentication packs found")
@@ -91,9 +198,7 @@ class USBPackSSHKeyGen:
         print(f"\n📦 Available authentication packs:")
         for i, pack in enumerate(packs):
             pack_path = os.path.join(pack_dir, pack)
-            pack_files = os.listdir(pack_path)
-            audio_files = [f for f in pack_files if f.endswith('.wav')]
-            json_files = [f for f in pack_files if f.endswith('.json')]
+            audio_files, json_files = self._scan_pack(pack_path)
             print(f"   {i+1}. {pack} ({len(audio_files)} audio, {len(json_files)} config)")
         
         if len(packs) == 1:
@@ -142,13 +247,9 @@ class USBPackSSHKeyGen:
         
         print("🔓 Decrypting USB pack container...")
         
-        # Find pack JSON file
-        pack_files = os.listdir(self.selected_pack_path)
-        json_file = None
-        for file in pack_files:
-            if file.endswith('.json') and 'pack' in file:
-                json_file = os.path.join(self.selected_pack_path, file)
-                break
+        # Find pack JSON file (directory already scanned during selection)
+        _, json_files = self._scan_pack(self.selected_pack_path)
+        json_file = next((f for f in json_files if 'pack' in os.path.basename(f)), None)
         
         if not json_file:
             print("❌ Pack configuration file not found")
@@ -159,8 +260,8 @@ class USBPackSSHKeyGen:
             self.pack_container = json.load(f)
         
         # Verify USB binding
-        usb_fingerprint = self.create_current_usb_fingerprint()
         required_fingerprint = self.pack_container['validation']['requires_usb_fingerprint']
+        usb_fingerprint = self.create_current_usb_fingerprint(required_fingerprint)
         
         if usb_fingerprint != required_fingerprint:
             print(f"❌ USB binding verification failed")
@@ -171,23 +272,17 @@ class USBPackSSHKeyGen:
         print("✅ USB binding verified")
         
         # Decrypt NFC and chaos values with USB binding
-        usb_key_material = (usb_fingerprint + "USB_BINDING").encode()
-        usb_kdf = PBKDF2HMAC(
-            algorithm=hashes.SHA256(),
-            length=32,
-            salt=b'USB_SPECIFIC_BINDING',
-            iterations=50000,
-        )
-        usb_key = base64.urlsafe_b64encode(usb_kdf.derive(usb_key_material))
-        usb_cipher = Fernet(usb_key)
+        binding_kdf = self.pack_container['pack_metadata'].get('binding_kdf')
+        kdf_iterations = self.pack_container['pack_metadata'].get('usb_kdf_iterations')
+        nfc_cipher, chaos_cipher = usb_binding_ciphers(usb_fingerprint, binding_kdf, kdf_iterations)
         
         # Decrypt values
         try:
             encrypted_nfc = self.pack_container['pack_metadata']['nfc_hash_encrypted']
             encrypted_chaos = self.pack_container['pack_metadata']['chaos_encrypted']
             
-            decrypted_nfc = usb_cipher.decrypt(encrypted_nfc.encode()).decode()
-            decrypted_chaos = usb_cipher.decrypt(encrypted_chaos.encode()).decode()
+            decrypted_nfc = nfc_cipher.decrypt(encrypted_nfc.encode()).decode()
+            decrypted_chaos = chaos_cipher.decrypt(encrypted_chaos.encode()).decode()
             
             # Verify NFC matches authentication
             if decrypted_nfc != nfc_hash:
@@ -209,32 +304,72 @@ class USBPackSSHKeyGen:
         
         print("🎵 Extracting audio fingerprint...")
         
-        # Find audio file
-        pack_files = os.listdir(self.selected_pack_path)
-        audio_file = None
-        for file in pack_files:
-            if file.endswith('.wav'):
-                audio_file = os.path.join(self.selected_pack_path, file)
-                break
+        # Find audio file (directory already scanned during selection)
+        audio_files, _ = self._scan_pack(self.selected_pack_path)
+        audio_file = audio_files[0] if audio_files else None
         
         if not audio_file:
             print("❌ Audio file not found in pack")
             return None
         
         try:
-            # Load audio and extract features
-            y, sr = librosa.load(audio_file)
+            # NumPy is only needed here, so the rest of the keygen starts without it
+            import numpy as np
             
-            # Extract multiple audio features for robust fingerprint
-            mfccs = librosa.feature.mfcc(y=y, sr=sr, n_mfcc=13)
-            spectral_centroid = librosa.feature.spectral_centroid(y=y, sr=sr)
-            zero_crossings = librosa.feature.zero_crossing_rate(y)
+            mfcc_sum = np.zeros(N_MFCC)
+            centroid_sum = 0.0
+            frame_count = 0
+            crossings = 0
+            sample_count = 0
+            last_sign = None
+            tail = np.zeros(0, dtype=np.float32)
+            
+            # Stream the audio at its native rate; only one block plus a frame overlap is held
+            with wave.open(audio_file, 'rb') as wf:
+                sr = wf.getframerate()
+                channels = wf.getnchannels()
+                sample_width = wf.getsampwidth()
+                tables = _feature_tables(sr)
+                
+                while True:
+                    raw = wf.readframes(AUDIO_BLOCK_FRAMES)
+                    if not raw:
+                        break
+                    
+                    block = _pcm_to_float(raw, sample_width)
+                    if channels > 1:
+                        block = block.reshape(-1, channels).mean(axis=1)
+                    
+                    # Zero crossings, including the one spanning the previous block
+                    signs = np.signbit(block)
+                    crossings += np.count_nonzero(signs[1:] != signs[:-1])
+                    if last_sign is not None and signs[0] != last_sign:
+                        crossings += 1
+                    last_sign = signs[-1]
+                    sample_count += len(block)
+                    
+                    # Frame every full window; carry the remainder so frames match a whole-file STFT
+                    buffer = np.concatenate([tail, block])
+                    if len(buffer) >= N_FFT:
+                        block_mfcc, block_centroid, block_frames = _frame_feature_sums(buffer, tables)
+                        mfcc_sum += block_mfcc
+                        centroid_sum += block_centroid
+                        frame_count += block_frames
+                        tail = buffer[block_frames * HOP_LENGTH:]
+                    else:
+                        tail = buffer
+            
+            if frame_count == 0:
+                # Shorter than one frame: zero-pad to a single frame
+                mfcc_sum, centroid_sum, frame_count = _frame_feature_sums(
+                    np.pad(tail, (0, N_FFT - len(tail))), tables
+                )
             
             # Create composite fingerprint
             features = np.concatenate([
-                np.mean(mfccs, axis=1),
-                np.mean(spectral_centroid),
-                np.mean(zero_crossings)
+                mfcc_sum / frame_count,
+                [centroid_sum / frame_count],
+                [crossings / max(sample_count, 1)]
             ])
             
             # Convert to deterministic hash
@@ -250,28 +385,14 @@ class USBPackSSHKeyGen:
             print(f"❌ Audio fingerprint extraction failed: {e}")
             return None
     
-    def create_current_usb_fingerprint(self):
+    def create_current_usb_fingerprint(self, required_fingerprint=''):
         """Create fingerprint of current USB drive"""
         
         try:
-            result = subprocess.run(['diskutil', 'info', self.selected_usb], 
-                                  capture_output=True, text=True)
-            
-            usb_info = {}
-            for line in result.stdout.split('\n'):
-                if 'Volume UUID' in line:
-                    usb_info['volume_uuid'] = line.split(':')[1].strip()
-                elif 'Device / Media Name' in line:
-                    usb_info['device_name'] = line.split(':')[1].strip()
-                elif 'Total Size' in line:
-                    usb_info['total_size'] = line.split(':')[1].strip()
-                elif 'File System Personality' in line:
-                    usb_info['filesystem'] = line.split(':')[1].strip()
+            # Same diskutil parse the capture system used when the pack was created
+            usb_info = probe_usb_info(self.selected_usb)
             
-            usb_info['mount_point'] = self.selected_usb
-            fingerprint_data = str(sorted(usb_info.items()))
-            
-            return hashlib.sha256(fingerprint_data.encode()).hexdigest()
+            return matching_usb_fingerprint(usb_info, required_fingerprint)
             
         except Exception as e:
             # Fallback fingerprint
@@ -303,24 +424,10 @@ class USBPackSSHKeyGen:
         print(f"   USB Binding: {self.pack_container['validation']['requires_usb_fingerprint'][:16]}...")
         
         # Derive deterministic SSH key material
-        ssh_kdf = PBKDF2HMAC(
-            algorithm=hashes.SHA256(),
-            length=32,
-            salt=b'SSH_KEY_DERIVATION_SALT',
-            iterations=100000,
-        )
+        key_material = hashlib.pbkdf2_hmac('sha256', master_seed, b'SSH_KEY_DERIVATION_SALT', 100000, dklen=32)
         
-        key_material = ssh_kdf.derive(master_seed)
-        
-        # Use key material as entropy for RSA generation
-        # Create deterministic random state
-        np.random.seed(int.from_bytes(key_material[:8], 'big'))
-        
-        # Generate RSA key pair
-        private_key = rsa.generate_private_key(
-            public_exponent=65537,
-            key_size=4096
-        )
+        # Ed25519 takes the 32-byte key material directly as its seed: deterministic, no prime search
+        private_key = Ed25519PrivateKey.from_private_bytes(key_material[:32])
         
         public_key = private_key.public_key()
         
@@ -338,22 +445,22 @@ class USBPackSSHKeyGen:
         
         # Create key names based on pack ID
         pack_id = self.pack_container['pack_metadata']['pack_id']
-        key_name = f"mobileshield_usb_{pack_id}"
+        key_name = f"mobileshield_usb_{pack_id}_ed25519"
         
         self.private_key_path = os.path.join(self.ssh_keys_dir, key_name)
         self.public_key_path = os.path.join(self.ssh_keys_dir, f"{key_name}.pub")
         
-        # Save SSH keys
-        with open(self.private_key_path, 'wb') as f:
+        # Save SSH keys: the private key is created 0600, never briefly world-readable
+        fd = os.open(self.private_key_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+        with os.fdopen(fd, 'wb') as f:
+            # An existing file keeps its old mode on open, so tighten it before writing
+            os.fchmod(fd, 0o600)
             f.write(private_pem)
         
-        # Set proper permissions for private key
-        os.chmod(self.private_key_path, 0o600)
-        
         # Create public key with comment
-        public_key_content = public_ssh.decode() + f" mobileshield-usb-{pack_id}@{os.uname().nodename}\n"
+        public_key_content = public_ssh + f" mobileshield-usb-{pack_id}@{_NODENAME}\n".encode()
         
-        with open(self.public_key_path, 'w') as f:
+        with open(self.public_key_path, 'wb') as f:
             f.write(public_key_content)
         
         print(f"✅ SSH keys generated:")
@@ -4,9 +4,57 @@ Hardware Verification Script for NFC Chaos Writer
 Checks NESDR RTL-SDR and NFC Reader/Writer connections
 """
 
+import os
 import subprocess
+import selectors
 import sys
 import time
+import io
+import functools
+import math
+from importlib.util import find_spec
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+# RF capture probe: any samples mean the NESDR works; reading stops after RF_PROBE_BYTES.
+# Tuner start-up can take a few seconds, so the wait is overridable via RF_PROBE_TIMEOUT
+RF_PROBE_BYTES = 65536
+DEFAULT_RF_PROBE_TIMEOUT = 3.0
+MAX_RF_PROBE_TIMEOUT = 60.0
+
+def _rf_probe_timeout():
+    """Seconds to wait for rtl_fm samples, from RF_PROBE_TIMEOUT when it is a sane number"""
+    
+    try:
+        timeout = float(os.environ.get('RF_PROBE_TIMEOUT', DEFAULT_RF_PROBE_TIMEOUT))
+    except ValueError:
+        return DEFAULT_RF_PROBE_TIMEOUT
+    # inf/nan or huge waits would overflow select's timeout
+    if not math.isfinite(timeout) or not 0 < timeout <= MAX_RF_PROBE_TIMEOUT:
+        return DEFAULT_RF_PROBE_TIMEOUT
+    return timeout
+
+class _ThreadBufferedStdout:
+    """sys.stdout stand-in that sends each probe thread's prints to its own buffer"""
+    
+    def __init__(self, stdout):
+        self._stdout = stdout
+        self._local = threading.local()
+    
+    def write(self, text):
+        return (getattr(self._local, 'buffer', None) or self._stdout).write(text)
+    
+    def flush(self):
+        self._stdout.flush()
+    
+    def capture(self, probe):
+        """Run probe with its output buffered; returns (result, output)"""
+        
+        self._local.buffer = io.StringIO()
+        try:
+            return probe(), self._local.buffer.getvalue()
+        finally:
+            self._local.buffer = None
 
 def check_nesdr():
     """Check if NESDR RTL-SDR is connected and working"""
@@ -35,9 +83,34 @@ def check_nesdr():
             test_cmd = ['rtl_fm', '-f', '433.92M', '-M', 'am', '-s', '200000', '-E', 'dc', '-']
             test_proc = subprocess.Popen(test_cmd, 
                                         stdout=subprocess.PIPE, 
-                                        stderr=subprocess.PIPE)
-            time.sleep(1)
-            test_proc.terminate()
+                                        stderr=subprocess.DEVNULL)
+            
+            # Read samples until enough arrive or the deadline passes;
+            # rtl_fm is always stopped, even if the read loop raises
+            received = 0
+            try:
+                deadline = time.monotonic() + _rf_probe_timeout()
+                with selectors.DefaultSelector() as sel:
+                    sel.register(test_proc.stdout, selectors.EVENT_READ)
+                    while received < RF_PROBE_BYTES:
+                        remaining = deadline - time.monotonic()
+                        if remaining <= 0:
+                            break
+                        if not sel.select(timeout=remaining):
+                            continue
+                        chunk = os.read(test_proc.stdout.fileno(), 65536)
+                        if not chunk:
+                            break
+                        received += len(chunk)
+            finally:
+                test_proc.terminate()
+                test_proc.wait()
+                test_proc.stdout.close()
+            
+            if not received:
+                print("⚠️  NESDR found but no RF samples arrived")
+                print("   Set RF_PROBE_TIMEOUT to wait longer for a slow tuner")
+                return False
             
             print("✅ NESDR is operational and ready for entropy collection")
             return True
@@ -57,6 +130,13 @@ def check_nesdr():
         print(f"❌ Error checking NESDR: {e}")
         return False
 
+@functools.lru_cache(maxsize=1)
+def pcsc_readers():
+    """PC/SC reader list, scanned once per run and shared by every caller"""
+    
+    import smartcard.System
+    return tuple(smartcard.System.readers())
+
 def check_nfc_pcsc():
     """Check NFC reader using PC/SC interface (more reliable on macOS)"""
     print("\n🔍 Checking NFC Reader/Writer via PC/SC...")
@@ -79,8 +159,7 @@ def check_nfc_pcsc():
     
     # Try alternative Python method
     try:
-        import smartcard.System
-        readers = smartcard.System.readers()
+        readers = pcsc_readers()
         
         if readers:
             for reader in readers:
@@ -142,19 +221,20 @@ def check_python_modules():
     print("\n🔍 Checking Python modules...")
     print("-" * 50)
     
+    # pip package -> (import name, description)
     modules = {
-        'pyrtlsdr': 'RTL-SDR control',
-        'pyscard': 'Smart card/NFC access',
-        'numpy': 'Signal processing',
-        'cryptography': 'Entropy processing'
+        'pyrtlsdr': ('rtlsdr', 'RTL-SDR control'),
+        'pyscard': ('smartcard', 'Smart card/NFC access'),
+        'numpy': ('numpy', 'Signal processing'),
+        'cryptography': ('cryptography', 'Entropy processing')
     }
     
+    # find_spec only locates each module; nothing heavy gets imported or executed
     missing = []
-    for module, description in modules.items():
-        try:
-            __import__(module)
+    for module, (import_name, description) in modules.items():
+        if find_spec(import_name) is not None:
             print(f"✅ {module:15} - {description}")
-        except ImportError:
+        else:
             print(f"❌ {module:15} - {description}")
             missing.append(module)
     
@@ -170,13 +250,44 @@ def main():
     print("   NFC CHAOS WRITER - HARDWARE VERIFICATION")
     print("=" * 60)
     
-    results = {
-        'NESDR': check_nesdr(),
-        'NFC_PCSC': check_nfc_pcsc(),
-        'NFC_Native': check_nfc_native(),
-        'Python': check_python_modules()
+    probes = {
+        'NESDR': check_nesdr,
+        'NFC_PCSC': check_nfc_pcsc,
+        'NFC_Native': check_nfc_native,
+        'Python': check_python_modules
     }
     
+    futures = {}
+    
+    if sys.platform == 'darwin':
+        def check_nfc_native_fallback():
+            """macOS blocks libnfc access to a reader PC/SC already sees; only try it if PC/SC failed"""
+            
+            if futures['NFC_PCSC'].result()[0]:
+                print("\n🔍 Checking NFC Reader/Writer via libnfc...")
+                print("-" * 50)
+                print("⏭️  Skipped on macOS - reader already available via PC/SC")
+                return False
+            return check_nfc_native()
+        
+        probes['NFC_Native'] = check_nfc_native_fallback
+    
+    # Probes are independent subprocess/device waits, so run them together and
+    # print each one's buffered output in order once it finishes
+    stdout = sys.stdout
+    sys.stdout = buffered = _ThreadBufferedStdout(stdout)
+    try:
+        with ThreadPoolExecutor(max_workers=len(probes)) as executor:
+            # NFC_PCSC is submitted before NFC_Native, so the fallback can always find it
+            for name, probe in probes.items():
+                futures[name] = executor.submit(buffered.capture, probe)
+            results = {}
+            for name, future in futures.items():
+                results[name], output = future.result()
+                stdout.write(output)
+    finally:
+        sys.stdout = stdout
+    
     print("\n" + "=" * 60)
     print("   VERIFICATION SUMMARY")
     print("=" * 60)
@@ -9,19 +9,15 @@ Zero-Knowledge NFC Authentication System
 
 import json
 import hashlib
+import hmac
 import logging
+import mmap
 import os
+import select
 import subprocess
 import sys
-import termios
-import tty
-import signal
+import time
 from datetime import datetime
-from cryptography.hazmat.primitives import hashes
-from cryptography.hazmat.primitives.kdf.pbkdf2 import PBKDF2HMAC
-from cryptography.hazmat.primitives.asymmetric import rsa
-from cryptography.hazmat.primitives import serialization
-import base64
 
 # Configure logging
 logging.basicConfig(
@@ -29,21 +25,243 @@ logging.basicConfig(
     format='%(asctime)s - %(levelname)s - %(message)s'
 )
 
+# Ambient capture length (NFC_AMBIENT_SECONDS or --ambient-seconds to shorten it for
+# scripted re-keying) and how long ffmpeg may overrun it before being stopped
+AMBIENT_SECONDS = 180
+MIN_AMBIENT_SECONDS = 5
+FFMPEG_GRACE_SECONDS = 20
+
+# Capture format: mono 16-bit PCM WAV, so every second of audio is a fixed number of bytes
+AMBIENT_SAMPLE_RATE = 22050
+AMBIENT_BYTES_PER_SECOND = AMBIENT_SAMPLE_RATE * 2
+WAV_HEADER_BYTES = 44
+
+# How long a positive barcode scanner check is trusted before re-running system_profiler
+SCANNER_CACHE_SECONDS = 60
+_scanner_seen_at = None
+
+# Seconds to wait for the barcode scanner to deliver a tag
+NFC_SCAN_TIMEOUT = 30
+
+# Volume names checked for the auth USB, in order of preference
+AUTH_USB_NAMES = ('YOUR_USB_DRIVE', 'SILVER', 'USB', 'Untitled')
+AUTH_PACK_NAME = 'zero_knowledge_auth_pack.json'
+
+# ~/.ssh/config alias managed by this script; earlier blocks for it are replaced
+SSH_HOST_ALIAS = 'github-nfc-auth'
+SSH_CONFIG_HEADER = '# Zero-Knowledge NFC GitHub Authentication'
+
+# SSH key types selectable with --algo; the first entry is the default
+SSH_KEY_ALGOS = ('ed25519', 'rsa2048')
+
+# Ambient-data digest for new packs; packs without "ambient_hash_alg" use sha256
+AMBIENT_HASH_ALG = 'blake2b'
+
+def _ambient_hasher(alg):
+    """Return a fresh hash object for the pack's ambient-data algorithm"""
+    
+    if alg == 'blake2b':
+        return hashlib.blake2b(digest_size=32)
+    return hashlib.sha256()
+
+def _advise_sequential(fd):
+    """Ask the kernel for aggressive read-ahead on a file read once front to back"""
+    
+    # The fadvise values are not bit flags, so each hint is a separate call;
+    # macOS has no posix_fadvise and simply skips this
+    for advice in ('POSIX_FADV_SEQUENTIAL', 'POSIX_FADV_WILLNEED'):
+        try:
+            os.posix_fadvise(fd, 0, 0, getattr(os, advice))
+        except (AttributeError, OSError):
+            pass
+
+def _fast_file_hash(path, alg=AMBIENT_HASH_ALG):
+    """Hash a file straight from the page cache via mmap, without copying it into Python"""
+    
+    h = _ambient_hasher(alg)
+    with open(path, 'rb', buffering=0) as f:
+        # mmap refuses zero-length files; their digest is just the empty hash
+        if os.fstat(f.fileno()).st_size:
+            _advise_sequential(f.fileno())
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+                # madvise is the read-ahead hint that also exists on macOS
+                for advice in ('MADV_SEQUENTIAL', 'MADV_WILLNEED'):
+                    if hasattr(mmap, advice):
+                        try:
+                            mm.madvise(getattr(mmap, advice))
+                        except OSError:
+                            pass
+                h.update(mm)
+    return h.hexdigest()
+
+def _bind_ambient_hash(nfc_hash, audio_hash, alg=AMBIENT_HASH_ALG):
+    """Bind the ambient-data digest to the NFC unlock hash"""
+    
+    h = _ambient_hasher(alg)
+    h.update(nfc_hash)
+    h.update(audio_hash.encode())
+    return h.digest()
+
+def _find_auth_usb(require_pack=False):
+    """Find the auth USB with one /Volumes listing instead of probing each name"""
+    
+    found = {}
+    try:
+        with os.scandir('/Volumes') as it:
+            for entry in it:
+                if entry.name in AUTH_USB_NAMES and entry.is_dir():
+                    found[entry.name] = entry.path
+    except OSError:
+        return None
+    
+    for name in AUTH_USB_NAMES:
+        path = found.get(name)
+        if path and (not require_pack or os.path.isfile(os.path.join(path, AUTH_PACK_NAME))):
+            return path
+    return None
+
+def _cli_value(flag, default):
+    """Return the value given as "flag VALUE" or "flag=VALUE" on the command line"""
+    
+    args = sys.argv[1:]
+    value = default
+    for i, arg in enumerate(args):
+        if arg.startswith(flag + '='):
+            value = arg.split('=', 1)[1]
+        elif arg == flag and i + 1 < len(args):
+            value = args[i + 1]
+    return value
+
+def _requested_key_algo():
+    """Return the SSH key type from --algo, or None if it is not supported"""
+    
+    algo = _cli_value('--algo', SSH_KEY_ALGOS[0])
+    return algo if algo in SSH_KEY_ALGOS else None
+
+def _requested_ambient_seconds():
+    """Return the capture length from --ambient-seconds, or None if it is too short to trust"""
+    
+    # A bad NFC_AMBIENT_SECONDS falls back to the default; short values are raised to the minimum
+    default = AMBIENT_SECONDS
+    env_value = os.environ.get('NFC_AMBIENT_SECONDS')
+    if env_value is not None:
+        try:
+            default = max(int(env_value), MIN_AMBIENT_SECONDS)
+        except ValueError:
+            logging.warning(f"⚠️ Ignoring invalid NFC_AMBIENT_SECONDS={env_value!r}, using {AMBIENT_SECONDS}s")
+    
+    try:
+        seconds = int(_cli_value('--ambient-seconds', default))
+    except ValueError:
+        return None
+    return seconds if seconds >= MIN_AMBIENT_SECONDS else None
+
+def _stop_ffmpeg(proc):
+    """Ask ffmpeg to finalize its output, killing it if it does not exit"""
+    
+    try:
+        proc.stdin.write(b'q\n')
+        proc.stdin.flush()
+    except (BrokenPipeError, OSError):
+        pass
+    try:
+        proc.wait(timeout=5)
+    except subprocess.TimeoutExpired:
+        proc.kill()
+        proc.wait()
+
+def capture_ambient_audio(audio_file, seconds=AMBIENT_SECONDS):
+    """Record ambient audio with ffmpeg, showing progress and keeping partial captures on abort"""
+    
+    proc = subprocess.Popen([
+        'ffmpeg', '-hide_banner', '-loglevel', 'error', '-nostats',
+        '-progress', 'pipe:2', '-threads', '1',
+        '-f', 'avfoundation', '-i', ':0',
+        '-t', str(seconds), '-ar', str(AMBIENT_SAMPLE_RATE), '-ac', '1', '-c:a', 'pcm_s16le',
+        audio_file, '-y'
+    ], stdin=subprocess.PIPE, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE, bufsize=0)
+    
+    deadline = time.monotonic() + seconds + FFMPEG_GRACE_SECONDS
+    errors = []
+    aborted = False
+    pending = b''
+    
+    try:
+        while True:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                print("\n⚠️ ffmpeg overran the capture window - stopping it")
+                _stop_ffmpeg(proc)
+                aborted = True
+                break
+            
+            ready, _, _ = select.select([proc.stderr], [], [], remaining)
+            if not ready:
+                continue
+            chunk = os.read(proc.stderr.fileno(), 1 << 16)
+            if not chunk:
+                break
+            
+            *lines, pending = (pending + chunk).split(b'\n')
+            for line in lines:
+                key, _, value = line.decode(errors='replace').strip().partition('=')
+                if key == 'out_time_ms' and value.isdigit():
+                    # ffmpeg reports out_time_ms in microseconds
+                    elapsed = min(int(value) // 1_000_000, seconds)
+                    print(f"\r   🎙️ Recording: {elapsed}/{seconds}s", end='', flush=True)
+                elif key and not value:
+                    errors.append(key)
+    except KeyboardInterrupt:
+        print("\n🛑 Capture interrupted - finalizing partial recording")
+        _stop_ffmpeg(proc)
+        aborted = True
+    
+    proc.wait()
+    print()
+    
+    if proc.returncode != 0 and not aborted:
+        for message in errors[-3:]:
+            logging.error(f"ffmpeg: {message}")
+        return False
+    
+    # A partial capture is still usable ambient data, but only above the entropy floor
+    try:
+        captured_bytes = os.path.getsize(audio_file) - WAV_HEADER_BYTES
+    except OSError:
+        return False
+    
+    captured_seconds = max(captured_bytes, 0) / AMBIENT_BYTES_PER_SECOND
+    if captured_seconds < MIN_AMBIENT_SECONDS:
+        print(f"❌ Only {captured_seconds:.1f}s of ambient audio captured (minimum {MIN_AMBIENT_SECONDS}s)")
+        return False
+    
+    if aborted:
+        print(f"⚠️ Using partial capture of {captured_seconds:.0f}s")
+    return True
+
 def check_barcode_scanner():
     """Check if barcode scanner is connected and ready"""
     
+    global _scanner_seen_at
+    
+    # Both scans of one login run within seconds of each other
+    if _scanner_seen_at is not None and time.monotonic() - _scanner_seen_at < SCANNER_CACHE_SECONDS:
+        return True
+    
     logging.info("🔍 Checking barcode scanner connection...")
     
     try:
         result = subprocess.run(
             ['system_profiler', 'SPUSBDataType'],
+            stdin=subprocess.DEVNULL,
             capture_output=True,
-            text=True,
-            timeout=10
+            timeout=10,
+            bufsize=1 << 20
         )
         
-        if "BARCODE SCANNER" in result.stdout:
+        if b"BARCODE SCANNER" in result.stdout:
             logging.info("✅ Barcode scanner detected")
+            _scanner_seen_at = time.monotonic()
             return True
         else:
             logging.warning("⚠️ Barcode scanner not detected")
@@ -53,6 +271,40 @@ def check_barcode_scanner():
         logging.error(f"❌ Scanner check failed: {e}")
         return False
 
+def _zeroize(buf):
+    """Overwrite a bytearray in place (rebinding a str never clears the original)"""
+    
+    buf[:] = bytes(len(buf))
+
+def _read_tag_line(timeout):
+    """Read one scanner line from stdin, raising TimeoutError if none arrives in time"""
+    
+    try:
+        fd = sys.stdin.fileno()
+        select.select([fd], [], [], 0)
+    except (OSError, ValueError):
+        # select can't watch stdin here (Windows consoles, no real fd): read without a timeout
+        return sys.stdin.readline().strip()
+    
+    # Read the raw fd so select and the read see the same data; a buffered
+    # readline could hold input that select no longer reports as ready
+    deadline = time.monotonic() + timeout
+    data = bytearray()
+    while b'\n' not in data:
+        remaining = deadline - time.monotonic()
+        ready, _, _ = select.select([fd], [], [], max(remaining, 0))
+        if not ready:
+            _zeroize(data)
+            raise TimeoutError("NFC scan timeout")
+        chunk = os.read(fd, 4096)
+        if not chunk:
+            break
+        data += chunk
+    
+    line = bytes(data).split(b'\n', 1)[0].decode(errors='replace').strip()
+    _zeroize(data)
+    return line
+
 def invisible_nfc_scan(purpose="authentication"):
     """Perform invisible NFC scan - never display or store raw data"""
     
@@ -71,56 +323,29 @@ def invisible_nfc_scan(purpose="authentication"):
     print("   🎯 Scan NFC tag now...")
     
     try:
-        def timeout_handler(signum, frame):
-            raise TimeoutError("NFC scan timeout")
+        # Use simple readline for barcode scanner input
+        tag_data = _read_tag_line(NFC_SCAN_TIMEOUT)
         
-        signal.signal(signal.SIGALRM, timeout_handler)
-        signal.alarm(30)  # 30 second timeout
-        
-        try:
-            fd = sys.stdin.fileno()
-            old_settings = termios.tcgetattr(fd)
-            
-            try:
-                # Use simple readline for barcode scanner input
-                tag_data = sys.stdin.readline().strip()
-                signal.alarm(0)  # Cancel timeout
-                
-            finally:
-                # Restore terminal settings if changed
-                try:
-                    termios.tcsetattr(fd, termios.TCSADRAIN, old_settings)
-                except:
-                    pass
-            
-            if not tag_data:
-                logging.error("❌ No tag data received")
-                return None
-            
-            # Immediately hash the tag data (NEVER store or display raw)
-            tag_hash = hashlib.sha256(tag_data.encode()).hexdigest()
-            
-            # Securely overwrite and clear raw tag data from memory
-            tag_data = "0" * len(tag_data)
-            del tag_data
-            
-            logging.info("✅ NFC scan completed - data processed invisibly")
-            print("✅ NFC scan completed (zero-knowledge mode)")
-            return tag_hash
-            
-        except TimeoutError:
-            logging.error("❌ NFC scan timeout")
-            print("❌ NFC scan timeout - please try again")
-            return None
-        except Exception as e:
-            logging.error(f"❌ NFC scan failed: {e}")
-            print(f"❌ NFC scan failed: {e}")
+        if not tag_data:
+            logging.error("❌ No tag data received")
             return None
-        finally:
-            signal.alarm(0)  # Ensure timeout is cancelled
-            
+        
+        # Immediately hash the tag data (NEVER store or display raw);
+        # the hex digest lives in a bytearray so callers can wipe it in place
+        tag_hash = bytearray(hashlib.sha256(tag_data.encode()).hexdigest(), 'ascii')
+        del tag_data
+        
+        logging.info("✅ NFC scan completed - data processed invisibly")
+        print("✅ NFC scan completed (zero-knowledge mode)")
+        return tag_hash
+        
+    except TimeoutError:
+        logging.error("❌ NFC scan timeout")
+        print("❌ NFC scan timeout - please try again")
+        return None
     except Exception as e:
-        logging.error(f"❌ NFC scan exception: {e}")
+        logging.error(f"❌ NFC scan failed: {e}")
+        print(f"❌ NFC scan failed: {e}")
         return None
 
 def create_fresh_usb_pack():
@@ -131,14 +356,13 @@ def create_fresh_usb_pack():
     print("This will create a new authentication pack bound to NFC unlock")
     print()
     
-    # Find USB drive
-    usb_paths = ['/Volumes/YOUR_USB_DRIVE', '/Volumes/SILVER', '/Volumes/USB', '/Volumes/Untitled']
-    usb_path = None
+    ambient_seconds = _requested_ambient_seconds()
+    if ambient_seconds is None:
+        print(f"❌ Ambient capture must be a whole number of seconds, at least {MIN_AMBIENT_SECONDS}")
+        return False
     
-    for path in usb_paths:
-        if os.path.exists(path):
-            usb_path = path
-            break
+    # Find USB drive
+    usb_path = _find_auth_usb()
     
     if not usb_path:
         print("❌ No USB drive found")
@@ -162,24 +386,18 @@ def create_fresh_usb_pack():
     print("✅ NFC unlock key bound (never stored)")
     
     # Capture ambient audio
-    print("\n🎵 STEP 2: AMBIENT AUDIO CAPTURE (3 minutes)")
+    print(f"\n🎵 STEP 2: AMBIENT AUDIO CAPTURE ({ambient_seconds} seconds)")
     print("Capturing environmental audio fingerprint...")
     
-    timestamp = int(datetime.now().timestamp())
+    now = datetime.now()
+    timestamp = int(now.timestamp())
     audio_file = os.path.join(auth_folder, f'ambient_audio_{timestamp}.wav')
     
     try:
-        # Capture 3 minutes of ambient audio
-        result = subprocess.run([
-            'ffmpeg', '-f', 'avfoundation', '-i', ':0',
-            '-t', '180', '-ar', '22050', '-ac', '1',
-            audio_file, '-y'
-        ], capture_output=True, text=True, timeout=200)
-        
-        if result.returncode == 0 and os.path.exists(audio_file):
-            with open(audio_file, 'rb') as f:
-                audio_data = f.read()
-            print(f"✅ Ambient audio captured: {len(audio_data)} bytes")
+        if capture_ambient_audio(audio_file, ambient_seconds):
+            audio_size = os.path.getsize(audio_file)
+            audio_hash = _fast_file_hash(audio_file)
+            print(f"✅ Ambient audio captured: {audio_size} bytes")
         else:
             print("❌ Ambient audio capture failed")
             return False
@@ -192,22 +410,24 @@ def create_fresh_usb_pack():
     print("\n🔐 STEP 3: ENCRYPTING AMBIENT DATA WITH NFC KEY")
     
     # Use NFC hash as encryption key for ambient data
-    encrypted_audio_hash = hashlib.sha256(f"{nfc_unlock_hash}{hashlib.sha256(audio_data).hexdigest()}".encode()).hexdigest()
+    encrypted_audio_hash = _bind_ambient_hash(nfc_unlock_hash, audio_hash).hex()
     
     # Create zero-knowledge auth pack
     pack_data = {
         "pack_version": "zero_knowledge_1.0",
         "pack_metadata": {
             "creation_time": timestamp,
-            "creation_date": datetime.now().isoformat(),
+            "creation_date": now.isoformat(),
             "pack_type": "zero_knowledge_nfc_auth",
             "security_model": "dual_nfc_unlock_system",
-            "auth_folder": "zero_knowledge_auth"
+            "auth_folder": "zero_knowledge_auth",
+            "ambient_hash_alg": AMBIENT_HASH_ALG
         },
         "encrypted_ambient_data": {
             "filename": os.path.basename(audio_file),
             "file_path": audio_file,
-            "file_size": len(audio_data),
+            "file_size": audio_size,
+            "audio_hash": audio_hash,
             "encrypted_hash": encrypted_audio_hash,
             "unlock_method": "nfc_key_required",
             "note": "Ambient data encrypted with NFC unlock key - unusable without NFC scan"
@@ -226,13 +446,12 @@ def create_fresh_usb_pack():
     }
     
     # Save auth pack
-    pack_file = os.path.join(usb_path, 'zero_knowledge_auth_pack.json')
-    with open(pack_file, 'w') as f:
-        json.dump(pack_data, f, indent=2)
+    pack_file = os.path.join(usb_path, AUTH_PACK_NAME)
+    with open(pack_file, 'wb') as f:
+        f.write(json.dumps(pack_data, indent=2).encode())
     
     # Securely clear NFC unlock hash from memory
-    nfc_unlock_hash = "0" * len(nfc_unlock_hash)
-    del nfc_unlock_hash
+    _zeroize(nfc_unlock_hash)
     
     print("✅ Zero-knowledge authentication pack created!")
     print(f"   Pack file: {pack_file}")
@@ -242,24 +461,83 @@ def create_fresh_usb_pack():
     
     return True
 
+def _create_key_file(path, data, mode):
+    """Create a new key file with its final mode so it is never briefly world-readable"""
+    
+    fd = os.open(path, os.O_WRONLY | os.O_CREAT | os.O_EXCL, mode)
+    with os.fdopen(fd, 'wb') as f:
+        f.write(data)
+
+def _replace_ssh_host_block(config_path, host, entry):
+    """Swap in a fresh Host block, dropping older ones so ssh never picks a stale key"""
+    
+    try:
+        with open(config_path, 'r') as f:
+            lines = f.read().splitlines(keepends=True)
+    except FileNotFoundError:
+        lines = []
+    
+    kept = []
+    skipping = False
+    for line in lines:
+        words = line.split()
+        if words and words[0].lower() == 'host' and words[1:] == [host]:
+            # Drop our header comment along with the block it introduces
+            body = ''.join(kept).rstrip()
+            if body.endswith(SSH_CONFIG_HEADER):
+                body = body[:-len(SSH_CONFIG_HEADER)].rstrip()
+                kept = [body + '\n\n'] if body else []
+            skipping = True
+            continue
+        
+        if skipping:
+            # Only the block's indented options go; the first unindented line ends
+            # it, and comments or blank lines the user wrote are kept
+            if line[:1] in (' ', '\t') and line.strip():
+                if not line.lstrip().startswith('#'):
+                    continue
+            else:
+                skipping = False
+        kept.append(line)
+    
+    # The new entry starts with its own blank separator line
+    existing = ''.join(kept).rstrip()
+    if existing:
+        existing += '\n'
+    
+    # Write beside the real file (it may be a dotfiles symlink) and swap it in
+    target = os.path.realpath(config_path)
+    tmp_path = target + '.tmp'
+    try:
+        os.unlink(tmp_path)
+    except FileNotFoundError:
+        pass
+    fd = os.open(tmp_path, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o600)
+    with os.fdopen(fd, 'w') as f:
+        f.write(existing + entry)
+    os.replace(tmp_path, target)
+
 def zero_knowledge_ssh_auth():
     """Perform zero-knowledge SSH authentication with dual NFC scans"""
     
+    # Only this flow needs cryptography; pack creation starts without loading it
+    import base64
+    from cryptography.hazmat.primitives import serialization
+    from cryptography.hazmat.primitives.asymmetric import rsa
+    from cryptography.hazmat.primitives.asymmetric.ed25519 import Ed25519PrivateKey
+    
     print("🔐 ZERO-KNOWLEDGE SSH AUTHENTICATION")
     print("=" * 60)
     print("Dual NFC scan system - no passphrase ever visible")
     print()
     
+    key_algo = _requested_key_algo()
+    if key_algo is None:
+        print(f"❌ Unsupported --algo (choose from: {', '.join(SSH_KEY_ALGOS)})")
+        return False
+    
     # Find USB drive
-    usb_paths = ['/Volumes/YOUR_USB_DRIVE', '/Volumes/SILVER', '/Volumes/USB', '/Volumes/Untitled']
-    usb_path = None
-    
-    for path in usb_paths:
-        if os.path.exists(path):
-            pack_file = os.path.join(path, 'zero_knowledge_auth_pack.json')
-            if os.path.exists(pack_file):
-                usb_path = path
-                break
+    usb_path = _find_auth_usb(require_pack=True)
     
     if not usb_path:
         print("❌ No USB with zero-knowledge auth pack found")
@@ -268,9 +546,9 @@ def zero_knowledge_ssh_auth():
     print(f"✅ Found USB: {usb_path}")
     
     # Load auth pack
-    pack_file = os.path.join(usb_path, 'zero_knowledge_auth_pack.json')
-    with open(pack_file, 'r') as f:
-        pack_data = json.load(f)
+    pack_file = os.path.join(usb_path, AUTH_PACK_NAME)
+    with open(pack_file, 'rb') as f:
+        pack_data = json.loads(f.read())
     
     print("✅ Zero-knowledge auth pack loaded")
     
@@ -285,19 +563,29 @@ def zero_knowledge_ssh_auth():
     # Load and decrypt ambient data
     audio_info = pack_data['encrypted_ambient_data']
     audio_file = audio_info['file_path']
+    hash_alg = pack_data['pack_metadata'].get('ambient_hash_alg', 'sha256')
+    audio_hash = audio_info.get('audio_hash')
     
-    if not os.path.exists(audio_file):
-        print("❌ Ambient audio file not found")
-        return False
-    
-    with open(audio_file, 'rb') as f:
-        audio_data = f.read()
+    # The capture is immutable, so only re-hash it for old packs or on request
+    if audio_hash is None or '--verify-integrity' in sys.argv:
+        if not os.path.exists(audio_file):
+            print("❌ Ambient audio file not found")
+            return False
+        
+        file_hash = _fast_file_hash(audio_file, hash_alg)
+        if audio_hash is not None and file_hash != audio_hash:
+            print("❌ Ambient audio file does not match the auth pack")
+            return False
+        audio_hash = file_hash
     
     # Verify unlock key matches
-    expected_hash = hashlib.sha256(f"{nfc_unlock_hash}{hashlib.sha256(audio_data).hexdigest()}".encode()).hexdigest()
-    stored_hash = audio_info['encrypted_hash']
+    expected_hash = _bind_ambient_hash(nfc_unlock_hash, audio_hash, hash_alg)
+    try:
+        stored_hash = bytes.fromhex(audio_info['encrypted_hash'])
+    except ValueError:
+        stored_hash = b''
     
-    if expected_hash != stored_hash:
+    if not hmac.compare_digest(expected_hash, stored_hash):
         print("❌ NFC unlock key verification failed")
         print("   Wrong NFC tag or ambient data corrupted")
         return False
@@ -316,33 +604,38 @@ def zero_knowledge_ssh_auth():
     print("\n🔐 STEP 3: INVISIBLE PASSPHRASE ASSEMBLY")
     print("Assembling passphrase from NFC + ambient data...")
     
-    audio_hash = hashlib.sha256(audio_data).hexdigest()
-    
-    # Create composite seed (Second NFC + Audio + First NFC as salt)
-    composite_seed = f"{nfc_passphrase_hash}{audio_hash}"
+    # Create composite seed (Second NFC + Audio + First NFC as salt). HMAC hashes
+    # keys longer than a SHA-256 block itself, so feeding PBKDF2 the digest of the
+    # 128-byte concatenation derives the same passphrase without building it
+    seed_hash = hashlib.sha256()
+    seed_hash.update(nfc_passphrase_hash)
+    seed_hash.update(audio_hash.encode())
+    composite_seed = bytearray(seed_hash.digest())
     
     # Generate passphrase using PBKDF2 with first NFC as salt
-    kdf = PBKDF2HMAC(
-        algorithm=hashes.SHA256(),
-        length=32,
-        salt=nfc_unlock_hash.encode()[:32],  # Use first NFC as salt
-        iterations=100000,
+    passphrase_bytes = hashlib.pbkdf2_hmac(
+        'sha256',
+        composite_seed,
+        memoryview(nfc_unlock_hash)[:32],  # Use first NFC as salt
+        100000,
+        dklen=32
     )
-    
-    passphrase_bytes = kdf.derive(composite_seed.encode())
-    passphrase = base64.b64encode(passphrase_bytes).decode()[:24]
+    passphrase = bytearray(base64.b64encode(passphrase_bytes)[:24])
     
     print("✅ Passphrase assembled invisibly")
     
     # Generate SSH keys
     print("\n🔑 STEP 4: SSH KEY GENERATION")
-    print("Generating SSH keys with invisible passphrase...")
+    print(f"Generating {key_algo} SSH keys with invisible passphrase...")
     
-    # Generate RSA key pair
-    private_key = rsa.generate_private_key(
-        public_exponent=65537,
-        key_size=2048,
-    )
+    # Ed25519 by default; RSA-2048 kept for hosts that still need it
+    if key_algo == 'rsa2048':
+        private_key = rsa.generate_private_key(
+            public_exponent=65537,
+            key_size=2048,
+        )
+    else:
+        private_key = Ed25519PrivateKey.generate()
     
     public_key = private_key.public_key()
     
@@ -350,7 +643,7 @@ def zero_knowledge_ssh_auth():
     private_pem = private_key.private_bytes(
         encoding=serialization.Encoding.PEM,
         format=serialization.PrivateFormat.OpenSSH,
-        encryption_algorithm=serialization.BestAvailableEncryption(passphrase.encode())
+        encryption_algorithm=serialization.BestAvailableEncryption(bytes(passphrase))
     )
     
     # Serialize public key
@@ -365,35 +658,35 @@ def zero_knowledge_ssh_auth():
     private_key_path = os.path.join(ssh_dir, f'zero_knowledge_nfc_{timestamp}')
     public_key_path = f'{private_key_path}.pub'
     
-    os.makedirs(ssh_dir, exist_ok=True)
-    
-    with open(private_key_path, 'wb') as f:
-        f.write(private_pem)
-    os.chmod(private_key_path, 0o600)
+    # ~/.ssh nearly always exists; when it doesn't, ssh expects it to be private
+    if not os.path.isdir(ssh_dir):
+        os.makedirs(ssh_dir, mode=0o700, exist_ok=True)
     
-    with open(public_key_path, 'wb') as f:
-        f.write(public_ssh)
-    os.chmod(public_key_path, 0o644)
+    try:
+        _create_key_file(private_key_path, private_pem, 0o600)
+        _create_key_file(public_key_path, public_ssh, 0o644)
+    except FileExistsError as e:
+        print(f"❌ Refusing to overwrite existing key file: {e.filename}")
+        return False
     
     print("✅ SSH keys generated and saved")
     print(f"   Private key: {private_key_path}")
     print(f"   Public key: {public_key_path}")
     
     # Update SSH config
-    ssh_config_path = os.path.expanduser('~/.ssh/config')
+    ssh_config_path = os.path.join(ssh_dir, 'config')
     config_entry = f"""
-# Zero-Knowledge NFC GitHub Authentication
-Host github-nfc-auth
+{SSH_CONFIG_HEADER}
+Host {SSH_HOST_ALIAS}
     HostName github.com
     User git
     IdentityFile {private_key_path}
     IdentitiesOnly yes
 """
     
-    with open(ssh_config_path, 'a') as f:
-        f.write(config_entry)
+    _replace_ssh_host_block(ssh_config_path, SSH_HOST_ALIAS, config_entry)
     
-    print("✅ SSH config updated (Host: github-nfc-auth)")
+    print(f"✅ SSH config updated (Host: {SSH_HOST_ALIAS})")
     
     # Display public key for GitHub
     print("\n🔗 ADD TO GITHUB SSH KEYS:")
@@ -402,12 +695,8 @@ Host github-nfc-auth
     print()
     
     # Securely clear all sensitive data from memory
-    nfc_unlock_hash = "0" * len(nfc_unlock_hash)
-    nfc_passphrase_hash = "0" * len(nfc_passphrase_hash)
-    passphrase = "0" * len(passphrase)
-    composite_seed = "0" * len(composite_seed)
-    
-    del nfc_unlock_hash, nfc_passphrase_hash, passphrase, composite_seed
+    for secret in (nfc_unlock_hash, nfc_passphrase_hash, passphrase, composite_seed):
+        _zeroize(secret)
     
     print("🔒 ZERO-KNOWLEDGE SECURITY VERIFIED:")
     print("=" * 40)